@@ -0,0 +1,48 @@
+import os
+import tempfile
+from io import BytesIO
+
+from aiogram.types import FSInputFile, Message
+
+from app.sender import BULK, send_scheduler
+from db.transfer import RowWriter
+
+# Больше этого размера присланные файлы со списками не читаем
+MAX_DOCUMENT_SIZE = 1024 * 1024
+
+
+class DocumentTooLarge(Exception):
+    """Присланный файл больше MAX_DOCUMENT_SIZE"""
+
+
+async def read_document_text(message: Message, max_size: int = MAX_DOCUMENT_SIZE) -> str:
+    """Скачать приложенный к сообщению документ и вернуть его содержимое как текст"""
+    document = message.document
+    if document.file_size and document.file_size > max_size:
+        raise DocumentTooLarge(document.file_size)
+    buffer = await message.bot.download(document, destination=BytesIO())
+    return buffer.getvalue().decode("utf-8-sig", errors="replace")
+
+
+async def send_rows(message: Message, rows, fields, filename: str, fmt: str = "csv", caption: str = None) -> int:
+    """Записать строки (асинхронный итератор dict) во временный файл CSV/JSONL и отправить его документом.
+
+    Строки пишутся в файл по мере чтения, aiogram отправляет файл с диска частями,
+    поэтому память не зависит от числа строк. Пустой результат не отправляется;
+    возвращает число строк.
+    """
+    count = 0
+    fh = tempfile.NamedTemporaryFile("w", suffix=f".{fmt}", newline="", encoding="utf-8", delete=False)
+    try:
+        with fh:
+            writer = RowWriter(fh, fmt, fields)
+            async for row in rows:
+                writer.write(row)
+                count += 1
+        if count:
+            # Файл удаляется после отправки, поэтому ждем ее, хоть она и в общей очереди
+            await send_scheduler.enqueue(
+                message.answer_document(FSInputFile(fh.name, filename=filename), caption=caption), BULK)
+    finally:
+        os.remove(fh.name)
+    return count
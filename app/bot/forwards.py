@@ -0,0 +1,98 @@
+import asyncio
+import html
+import time
+from typing import Dict, Tuple
+
+from aiogram.types import Message
+from loguru import logger
+
+from app.bot.keyboards.kbd import get_persistent_keyboard
+from app.config import settings
+
+# Сколько отправителей перечислять в сводном ответе, остальные только считаются
+SUMMARY_ORIGINS_LIMIT = 50
+
+
+class _Batch:
+    __slots__ = ("message", "started", "deadline", "count", "origins", "task")
+
+    def __init__(self, message: Message, now: float):
+        self.message = message
+        self.started = now
+        self.deadline = now
+        self.count = 0
+        # ключ отправителя -> [подробный текст, строка сводки, сколько сообщений]
+        self.origins: Dict[Tuple, list] = {}
+        self.task = None
+
+
+class ForwardCollector:
+    """Один ответ на пачку пересланных сообщений.
+
+    Пересылки копятся по ключу (чат, media_group_id): ответ уходит, когда
+    debounce секунд не приходит новых, но не позже max_wait от первой.
+    На одну пересылку ответ прежний, подробный; на несколько — список
+    уникальных отправителей с ID.
+    """
+
+    def __init__(self, debounce: float = 1.0, max_wait: float = 5.0):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self._batches: Dict[Tuple, _Batch] = {}
+
+    def add(self, message: Message, origin_key: Tuple, details: str, summary: str):
+        key = (message.chat.id, message.media_group_id)
+        now = time.monotonic()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(message, now)
+            batch.task = asyncio.ensure_future(self._flush_later(key, batch))
+        batch.deadline = min(now + self.debounce, batch.started + self.max_wait)
+        batch.count += 1
+        origin = batch.origins.setdefault(origin_key, [details, summary, 0])
+        origin[2] += 1
+
+    async def _flush_later(self, key, batch: _Batch):
+        # Срок сдвигается новыми пересылками, поэтому спим до актуального
+        while True:
+            delay = batch.deadline - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        await self._send(batch)
+
+    async def _send(self, batch: _Batch):
+        message = batch.message
+        try:
+            await message.answer(self._format(batch), reply_markup=get_persistent_keyboard(message.chat.id))
+        except Exception as e:
+            logger.error(f"Ошибка ответа на пересланные сообщения в чате {message.chat.id}: {e}")
+
+    @staticmethod
+    def _format(batch: _Batch) -> str:
+        if len(batch.origins) == 1 and batch.count == 1:
+            return next(iter(batch.origins.values()))[0]
+        lines = [f"🔁 <b>Переслано сообщений: {batch.count}, отправителей: {len(batch.origins)}</b>"]
+        for _, summary, count in list(batch.origins.values())[:SUMMARY_ORIGINS_LIMIT]:
+            lines.append(summary + (f" ×{count}" if count > 1 else ""))
+        if len(batch.origins) > SUMMARY_ORIGINS_LIMIT:
+            lines.append(f"… и ещё {len(batch.origins) - SUMMARY_ORIGINS_LIMIT}")
+        return "\n".join(lines)
+
+    async def flush_all(self):
+        """Сразу ответить на все накопленные пачки (при остановке бота)"""
+        batches, self._batches = list(self._batches.values()), {}
+        for batch in batches:
+            batch.task.cancel()
+            await self._send(batch)
+
+
+def origin_line(icon: str, name: str, origin_id) -> str:
+    """Строка сводки об отправителе: значок, имя и ID"""
+    line = f"{icon} {html.escape(name or 'Нет данных')}"
+    return line + (f" — <code>{origin_id}</code>" if origin_id is not None else "")
+
+
+forward_collector = ForwardCollector(debounce=settings.FORWARD_DEBOUNCE, max_wait=settings.FORWARD_MAX_WAIT)
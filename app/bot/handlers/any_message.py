@@ -14,5 +14,5 @@ async def other_messages(message: Message):
             "• Команду /id\n"
             "• Перешлите сообщение\n"
             "• Выберите варианты через кнопки ниже",
-            reply_markup=get_persistent_keyboard()
+            reply_markup=get_persistent_keyboard(message.chat.id)
         )
@@ -1,63 +1,146 @@
+import html
+import re
+
 from aiogram import Router, types
 from aiogram.filters import Command
 
+from app.bot.documents import DocumentTooLarge, read_document_text, send_rows
 from app.config import settings
+from app.sender import BULK, send_scheduler
 from db import db
+from db.sqlite import MAX_INTEGER
+from db.transfer import FIELDS, FORMATS
 
 router = Router()
 
+# ID в команде или файле разделяются пробелами, переводами строк, запятыми или точками с запятой
+_ID_SEPARATORS = re.compile(r"[\s,;]+")
+# Сколько ID каждой группы перечислять в ответе
+SUMMARY_IDS_LIMIT = 50
+# Больше стольких пользователей /list отправляет файлом, а не сообщением
+LIST_TEXT_LIMIT = 100
+# Строк за одно чтение из базы при выгрузке файлом
+EXPORT_BATCH_SIZE = 1000
 
-@router.message(Command("add"))
-async def add_user(message: types.Message):
-    args = message.text.split()
-    if len(args) < 2 or not args[1].isdigit():
-        return await message.answer("❌ Укажите ID: /add <user_id>")
+ADD_USAGE = ("❌ Укажите ID: /add <user_id> [user_id ...]\n"
+             "или пришлите текстовый файл со списком ID с подписью /add")
+REMOVE_USAGE = ("❌ Укажите ID: /remove <user_id> [user_id ...]\n"
+                "или пришлите текстовый файл со списком ID с подписью /remove")
 
-    user_id = int(args[1])
 
-    if user_id == settings.SUPER_ADMIN_ID:
-        return await message.answer("🚫 Суперадмин всегда имеет доступ, добавлять не нужно.")
+def _summary_line(title, ids):
+    """Строка сводки по группе ID; длинные списки обрезаются, чтобы не превысить лимит сообщения.
 
-    if db.add_user(user_id):
-        await message.answer(f"✅ Пользователь {user_id} добавлен в whitelist")
-        return None
-    else:
-        await message.answer(f"⚠️ Пользователь {user_id} уже в whitelist")
+    В группе некорректных ID — токены из сообщения пользователя, они экранируются для HTML.
+    """
+    shown = ", ".join(html.escape(str(user_id)) for user_id in ids[:SUMMARY_IDS_LIMIT])
+    if len(ids) > SUMMARY_IDS_LIMIT:
+        shown += f" … и ещё {len(ids) - SUMMARY_IDS_LIMIT}"
+    return f"{title} ({len(ids)}): {shown}"
+
+
+def _format_summary(groups):
+    return "\n".join(_summary_line(title, ids) for title, ids in groups if ids)
+
+
+def _parse_id(token):
+    """ID пользователя из токена или None: только цифры ASCII, число от 1 до MAX_INTEGER"""
+    if not (token.isascii() and token.isdigit()):
         return None
+    user_id = int(token)
+    return user_id if 0 < user_id <= MAX_INTEGER else None
 
 
-@router.message(Command('remove'))
-async def remove_user(message: types.Message):
-    args = message.text.split()
-    if len(args) < 2 or not args[1].isdigit():
-        return await message.answer("❌ Укажите ID: /remove <user_id>")
+async def _collect_ids(message: types.Message):
+    """ID из аргументов команды и приложенного текстового файла.
 
-    user_id = int(args[1])
+    Возвращает (ids, invalid): числа в порядке появления и токены, которые не являются ID.
+    """
+    text = message.text or message.caption or ""
+    tokens = _ID_SEPARATORS.split(text)[1:]  # первый токен — сама команда
+    if message.document:
+        tokens += _ID_SEPARATORS.split(await read_document_text(message))
 
-    # Защита: нельзя удалить самого себя
-    if user_id == message.from_user.id:
-        return await message.answer("⚠️ Нельзя удалить самого себя!")
+    ids, invalid = [], []
+    for token in tokens:
+        if not token:
+            continue
+        user_id = _parse_id(token)
+        if user_id is None:
+            invalid.append(token)
+        else:
+            ids.append(user_id)
+    return list(dict.fromkeys(ids)), invalid
 
-    # Защита: суперадмина вообще нельзя удалить
-    if user_id == settings.SUPER_ADMIN_ID:
-        return await message.answer("🚫 Нельзя удалить суперадмина!")
 
-    if db.remove_user(user_id):
-        await message.answer(f"🗑 Пользователь {user_id} удалён")
-        return None
-    else:
-        await message.answer(f"⚠️ Пользователь {user_id} не найден")
-        return None
+@router.message(Command("add"))
+async def add_user(message: types.Message):
+    try:
+        ids, invalid = await _collect_ids(message)
+    except DocumentTooLarge:
+        return await message.answer("❌ Файл слишком большой")
+    if not ids:
+        return await message.answer(ADD_USAGE)
+
+    # Суперадмин всегда имеет доступ, добавлять не нужно
+    skipped = [user_id for user_id in ids if user_id == settings.SUPER_ADMIN_ID]
+    added, existing = await db.add_users([user_id for user_id in ids if user_id != settings.SUPER_ADMIN_ID])
+
+    await message.answer(_format_summary([
+        ("✅ Добавлены в whitelist", added),
+        ("⚠️ Уже в whitelist", existing),
+        ("🚫 Суперадмин, добавлять не нужно", skipped),
+        ("❌ Некорректные ID", invalid),
+    ]))
+    return None
+
+
+@router.message(Command('remove'))
+async def remove_user(message: types.Message):
+    try:
+        ids, invalid = await _collect_ids(message)
+    except DocumentTooLarge:
+        return await message.answer("❌ Файл слишком большой")
+    if not ids:
+        return await message.answer(REMOVE_USAGE)
+
+    # Защита: нельзя удалить самого себя и суперадмина
+    protected = {message.from_user.id, settings.SUPER_ADMIN_ID}
+    skipped = [user_id for user_id in ids if user_id in protected]
+    removed, missing = await db.remove_users([user_id for user_id in ids if user_id not in protected])
+
+    await message.answer(_format_summary([
+        ("🗑 Удалены", removed),
+        ("⚠️ Не найдены", missing),
+        ("🚫 Нельзя удалить себя или суперадмина", skipped),
+        ("❌ Некорректные ID", invalid),
+    ]))
+    return None
 
 
 @router.message(Command("list"))
 async def show_whitelist(message: types.Message):
-    """Показать всех пользователей в белом списке"""
-    users = db.get_all_users()
-    if not users:
-        await message.answer("📝 Белый список пуст.")
+    """Показать всех пользователей в белом списке; /list csv или /list jsonl — выгрузить файлом"""
+    args = message.text.split()
+    fmt = args[1].lower() if len(args) > 1 else None
+    if fmt not in FORMATS:
+        fmt = None
+        count = await db.count_users()
+        if not count:
+            await message.answer("📝 Белый список пуст.")
+            return
+        # Длинный список не влезет в сообщение
+        if count > LIST_TEXT_LIMIT:
+            fmt = "csv"
+    if fmt:
+        rows = db.iter_users(EXPORT_BATCH_SIZE)
+        caption = "📋 Пользователи в белом списке"
+        if not await send_rows(message, rows, FIELDS["whitelist"], f"whitelist.{fmt}", fmt, caption=caption):
+            await message.answer("📝 Белый список пуст.")
         return
 
+    users = await db.get_all_users()
+
     user_list = "📋 Пользователи в белом списке:\n\n"
     for user in users:
         user_info = f"ID: {user.user_id}"
@@ -65,14 +148,14 @@ async def show_whitelist(message: types.Message):
             user_info += f" | @{user.username}"
         user_list += f"• {user_info}\n"
 
-    await message.answer(user_list)
+    send_scheduler.enqueue(message.answer(user_list), BULK)
 
 
 @router.message(Command("check"))
 async def check_access(message: types.Message):
     """Проверить, есть ли пользователь в белом списке"""
     user_id = message.from_user.id
-    if db.is_user_whitelisted(user_id):
+    if await db.is_user_whitelisted(user_id):
         await message.answer("✅ Вы в белом списке!")
     else:
         await message.answer("❌ Вас нет в белом списке.")
@@ -1,11 +1,27 @@
+import csv
+import html
+from io import StringIO
+
 from aiogram import Router
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
 
+from app.bot.documents import DocumentTooLarge, read_document_text, send_rows
+from app.bot.keyboards.kbd import PageCallback, get_pagination_keyboard
+from app.config import settings
+from app.sender import BULK, send_scheduler
 from db.database_new import new_db_instance as accounts_db
+from db.normalize import detect_identifier
+from db.transfer import FIELDS, FORMATS
 
 router = Router()
 
+PAGE_SIZE = 20
+# Строк за одно чтение из базы при выгрузке файлом
+EXPORT_BATCH_SIZE = 1000
+# Telegram ограничивает сообщение 4096 символами, оставляем запас
+MESSAGE_LIMIT = 4000
+
 
 @router.message(Command("find_phone"))
 async def find_phone_command(message: Message):
@@ -15,78 +31,318 @@ async def find_phone_command(message: Message):
         return
 
     phone_number = args[1]
-    result = accounts_db.find_by_phone_number(phone_number)
+    result = await accounts_db.find_by_phone_number(phone_number)
 
     if not result["accounts"]:
-        await message.answer(f"По номеру <code>{phone_number}</code> ничего не найдено", parse_mode="HTML")
+        await message.answer(f"По номеру <code>{html.escape(phone_number)}</code> ничего не найдено", parse_mode="HTML")
+        return
+
+    await message.answer(_format_lookup(f"Найдено по номеру <code>{html.escape(phone_number)}</code>:", result),
+                         parse_mode="HTML")
+
+
+# Подписи распознанных типов идентификатора для /find
+_IDENTIFIER_KINDS = {
+    "number": "Telegram ID, телефону или WhatsApp ID",
+    "phone": "телефону",
+    "tag": "тегу",
+    "email": "email",
+    "whatsapp": "WhatsApp ID",
+}
+
+
+@router.message(Command("find"))
+async def find_command(message: Message):
+    args = message.text.split(maxsplit=1)
+    if len(args) < 2:
+        await message.answer("Укажите идентификатор после /find: Telegram ID, @тег, email, WhatsApp ID или телефон, "
+                             "например: /find @ivanov")
+        return
+
+    value = args[1].strip()
+    result = await accounts_db.find_by_identifier(value)
+
+    if result["kind"] is None:
+        await message.answer(f"Не удалось распознать идентификатор <code>{html.escape(value)}</code>", parse_mode="HTML")
+        return
+    kind = _IDENTIFIER_KINDS[result["kind"]]
+    if not result["accounts"]:
+        await message.answer(f"По {kind} <code>{html.escape(value)}</code> ничего не найдено", parse_mode="HTML")
+        return
+
+    await message.answer(_format_lookup(f"Найдено по {kind} <code>{html.escape(value)}</code>:", result), parse_mode="HTML")
+
+
+@router.message(Command("find_linked"))
+async def find_linked_command(message: Message):
+    args = message.text.split()
+    if len(args) < 2:
+        await message.answer("Укажите идентификатор и, если нужно, глубину после /find_linked, например: "
+                             f"/find_linked +79991234567 2 (глубина не больше {settings.LINKED_MAX_DEPTH})")
+        return
+
+    value = args[1]
+    depth = settings.LINKED_MAX_DEPTH
+    if len(args) > 2:
+        if not args[2].isdigit():
+            await message.answer("Глубина должна быть числом")
+            return
+        depth = min(int(args[2]), settings.LINKED_MAX_DEPTH)
+
+    result = await accounts_db.find_linked(value, depth, settings.LINKED_MAX_PERSONS, settings.LINKED_MAX_ACCOUNTS)
+    if result["kind"] is None:
+        await message.answer(f"Не удалось распознать идентификатор <code>{html.escape(value)}</code>", parse_mode="HTML")
+        return
+    if not result["persons"]:
+        await message.answer(f"По <code>{html.escape(value)}</code> ничего не найдено", parse_mode="HTML")
         return
 
-    response = f"Найдено по номеру <code>{phone_number}</code>:\n"
-    response += f"<b>Аккаунты ({len(result['accounts'])}):</b>\n"
+    parts = _split_message(_format_linked(value, depth, result))
+    await message.answer(parts[0], parse_mode="HTML")
+    for part in parts[1:]:
+        send_scheduler.enqueue(message.answer(part, parse_mode="HTML"), BULK)
+
+
+def _format_linked(value, depth, result):
+    """Строки ответа /find_linked: люди по шагам обхода, под каждым его аккаунты"""
+    accounts = {}
     for acc in result["accounts"]:
-        response += f"- {acc['messenger_type'].capitalize()}: "
-        if acc["telegram_id"]:
-            response += f"Telegram ID=<code>{acc['telegram_id']}</ affirme>, Tag=<code>{acc['telegram_tag'] or 'нет'}</code>, "
-        if acc["phone_number"]:
-            response += f"Phone=<code>{acc['phone_number']}</code>, "
-        if acc["whatsapp_id"]:
-            response += f"WhatsApp ID=<code>{acc['whatsapp_id']}</code>, "
-        if acc["email"]:
-            response += f"Email=<code>{acc['email']}</code>"
-        response += "\n"
-
-    response += f"\n<b>Люди ({len(result['persons'])}):</b>\n"
+        accounts.setdefault(acc["person_id"], []).append(acc)
+    lines = [f"Связи <code>{html.escape(value)}</code> (глубина {depth}): людей {len(result['persons'])}, "
+             f"аккаунтов {len(result['accounts'])}"]
     for person in result["persons"]:
-        response += f"- {person['last_name']} {person['first_name']}"
+        name = " ".join(filter(None, [person["last_name"], person["first_name"], person["middle_name"]]))
+        lines.append(f"\n<b>{html.escape(name)}</b> (ID: <code>{person['id']}</code>, шаг {person['depth']})")
+        for acc in accounts.get(person["id"], []):
+            lines.append(_format_account_dict(acc))
+    if result["truncated"]:
+        lines.append("\nРезультат обрезан лимитом, уточните запрос или уменьшите глубину")
+    return lines
+
+
+def _split_message(lines):
+    """Склеить строки в сообщения не длиннее MESSAGE_LIMIT"""
+    parts, current = [], ""
+    for line in lines:
+        if current and len(current) + len(line) + 1 > MESSAGE_LIMIT:
+            parts.append(current)
+            current = line.lstrip("\n")
+        else:
+            current = f"{current}\n{line}" if current else line
+    parts.append(current)
+    return parts
+
+
+def _format_account_dict(acc):
+    line = f"- {html.escape(acc['messenger_type'].capitalize())}: "
+    if acc["telegram_id"]:
+        line += f"Telegram ID=<code>{acc['telegram_id']}</code>, Tag=<code>{html.escape(acc['telegram_tag'] or 'нет')}</code>, "
+    if acc["phone_number"]:
+        line += f"Phone=<code>{html.escape(acc['phone_number'])}</code>, "
+    if acc["whatsapp_id"]:
+        line += f"WhatsApp ID=<code>{html.escape(acc['whatsapp_id'])}</code>, "
+    if acc["email"]:
+        line += f"Email=<code>{html.escape(acc['email'])}</code>"
+    return line
+
+
+# Колонки CSV с результатами /find_file
+FIND_FILE_FIELDS = ["query", "status", "kind", "person_id", "last_name", "first_name", "middle_name",
+                    "account_id", "messenger_type", "telegram_id", "telegram_tag", "phone_number",
+                    "whatsapp_id", "email"]
+
+
+# Названия колонок, которыми обычно подписывают столбцы; многие из них похожи на теги
+_HEADER_NAMES = {name.casefold() for name in FIND_FILE_FIELDS + FIELDS["accounts"] + [
+    "phone", "tag", "id", "username", "identifier", "value", "whatsapp", "telegram",
+    "телефон", "номер", "тег", "ник", "логин", "почта", "идентификатор", "значение",
+]}
+
+
+def _is_header(row):
+    """Первая строка — заголовок, если в ней нет ни одного идентификатора, кроме названий колонок"""
+    cells = [cell.strip() for cell in row if cell.strip()]
+    return bool(cells) and all(
+        cell.casefold() in _HEADER_NAMES or detect_identifier(cell)[0] is None for cell in cells
+    )
+
+
+def _read_identifiers(text):
+    """Идентификаторы из текста: по одному в строке или ячейки CSV (разделитель , ; или табуляция).
+
+    Строка заголовка CSV (phone, email…) пропускается.
+    """
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    values = []
+    for line_num, row in enumerate(csv.reader(StringIO(text), dialect)):
+        if line_num == 0 and _is_header(row):
+            continue
+        values.extend(cell.strip() for cell in row if cell.strip())
+    return list(dict.fromkeys(values))
+
+
+async def _find_file_rows(values):
+    async for value, kind, account, person in accounts_db.lookup_many(values):
+        row = {"query": value, "kind": kind}
+        if account is None:
+            row["status"] = "not_found" if kind else "unrecognized"
+            yield row
+            continue
+        row.update(account, status="found", account_id=account["id"], last_name=person["last_name"],
+                   first_name=person["first_name"], middle_name=person["middle_name"])
+        yield row
+
+
+@router.message(Command("find_file"))
+async def find_file_command(message: Message):
+    # Файл с подписью /find_file или ответ /find_file на сообщение с файлом
+    source = message if message.document else message.reply_to_message
+    if source is None or source.document is None:
+        await message.answer("Пришлите текстовый или CSV-файл с телефонами, тегами, email или ID "
+                             "с подписью /find_file или ответьте /find_file на сообщение с файлом")
+        return
+    try:
+        values = _read_identifiers(await read_document_text(source))
+    except DocumentTooLarge:
+        await message.answer("❌ Файл слишком большой")
+        return
+    if not values:
+        await message.answer("В файле нет идентификаторов")
+        return
+    if len(values) > settings.FIND_FILE_MAX_ITEMS:
+        await message.answer(f"❌ В файле {len(values)} идентификаторов, за раз можно не больше "
+                             f"{settings.FIND_FILE_MAX_ITEMS}")
+        return
+
+    await send_rows(message, _find_file_rows(values), FIND_FILE_FIELDS, "find_results.csv",
+                    caption=f"Результаты поиска по {len(values)} идентификаторам")
+
+
+def _format_lookup(header, result):
+    """Текст ответа на поиск: найденные аккаунты и их владельцы"""
+    lines = [header, f"<b>Аккаунты ({len(result['accounts'])}):</b>"]
+    for acc in result["accounts"]:
+        lines.append(_format_account_dict(acc))
+
+    lines.append(f"\n<b>Люди ({len(result['persons'])}):</b>")
+    for person in result["persons"]:
+        line = f"- {html.escape(person['last_name'])} {html.escape(person['first_name'])}"
         if person["middle_name"]:
-            response += f" {person['middle_name']}"
+            line += f" {html.escape(person['middle_name'])}"
         if person["description"]:
-            response += f" ({person['description']})"
-        response += f" (ID: <code>{person['id']}</code>)\n"
+            line += f" ({html.escape(person['description'])})"
+        lines.append(line + f" (ID: <code>{person['id']}</code>)")
+    return "\n".join(lines)
+
 
-    await message.answer(response, parse_mode="HTML")
+def _format_person(person):
+    line = f"- {html.escape(person.last_name)} {html.escape(person.first_name)}"
+    if person.middle_name:
+        line += f" {html.escape(person.middle_name)}"
+    if person.description:
+        line += f" ({html.escape(person.description)})"
+    return line + f" (ID: <code>{person.id}</code>)"
+
+
+def _format_account(acc):
+    line = f"- {html.escape(acc.messenger_type.capitalize())} (Person ID: <code>{acc.person_id}</code>): "
+    if acc.telegram_id:
+        line += f"Telegram ID=<code>{acc.telegram_id}</code>, Tag=<code>{html.escape(acc.telegram_tag or 'нет')}</code>, "
+    if acc.phone_number:
+        line += f"Phone=<code>{html.escape(acc.phone_number)}</code>, "
+    if acc.whatsapp_id:
+        line += f"WhatsApp ID=<code>{html.escape(acc.whatsapp_id)}</code>, "
+    if acc.email:
+        line += f"Email=<code>{html.escape(acc.email)}</code>"
+    return line
+
+
+# entity -> (выборка страницы, заголовок, форматирование строки, текст для пустого списка)
+_LISTS = {
+    "persons": (accounts_db.get_persons_page, "<b>Список людей:</b>", _format_person, "Список людей пуст"),
+    "accounts": (accounts_db.get_accounts_page, "<b>Список аккаунтов:</b>", _format_account, "Список аккаунтов пуст"),
+}
+
+
+async def _build_list_page(entity, cursor=0, backward=False):
+    """Текст и клавиатура одной страницы списка; (None, None), если записей нет"""
+    get_page, title, format_item, _ = _LISTS[entity]
+    page = await get_page(cursor=cursor, limit=PAGE_SIZE, backward=backward)
+    if not page.items:
+        return None, None
+
+    # Строки не влезшие в лимит сообщения переезжают на следующую страницу
+    lines = [title]
+    length = len(title)
+    shown = []
+    for item in page.items:
+        line = format_item(item)
+        if shown and length + len(line) + 1 > MESSAGE_LIMIT:
+            break
+        lines.append(line)
+        length += len(line) + 1
+        shown.append(item)
+
+    has_next = page.has_next or len(shown) < len(page.items)
+    markup = get_pagination_keyboard(entity, shown[0].id, shown[-1].id, page.has_prev, has_next)
+    return "\n".join(lines), markup
+
+
+async def _export_list(message: Message, entity, fmt):
+    """Выгрузить всю таблицу файлом: строки читаются из базы пачками и сразу пишутся в файл"""
+    rows = accounts_db.iter_rows(entity, EXPORT_BATCH_SIZE)
+    if not await send_rows(message, rows, FIELDS[entity], f"{entity}.{fmt}", fmt):
+        await message.answer(_LISTS[entity][3])
+
+
+def _export_format(message: Message):
+    """Формат выгрузки из аргумента команды (/list_persons csv) или None для постраничного вывода"""
+    args = message.text.split()
+    return args[1].lower() if len(args) > 1 and args[1].lower() in FORMATS else None
 
 
 @router.message(Command("list_persons"))
 async def list_persons_command(message: Message):
-    persons = accounts_db.get_all_persons()
-    if not persons:
-        await message.answer("Список людей пуст")
+    fmt = _export_format(message)
+    if fmt:
+        await _export_list(message, "persons", fmt)
         return
-
-    response = "<b>Список людей:</b>\n"
-    for person in persons:
-        response += f"- {person.last_name} {person.first_name}"
-        if person.middle_name:
-            response += f" {person.middle_name}"
-        if person.description:
-            response += f" ({person.description})"
-        response += f" (ID: <code>{person.id}</code>)\n"
-
-    await message.answer(response, parse_mode="HTML")
+    text, markup = await _build_list_page("persons")
+    if text is None:
+        await message.answer(_LISTS["persons"][3])
+        return
+    # Страницы списков — массовый вывод: уступают очередь ответам на команды
+    send_scheduler.enqueue(message.answer(text, parse_mode="HTML", reply_markup=markup), BULK)
 
 
 @router.message(Command("list_accounts"))
 async def list_accounts_command(message: Message):
-    accounts = accounts_db.get_all_accounts()
-    if not accounts:
-        await message.answer("Список аккаунтов пуст")
+    fmt = _export_format(message)
+    if fmt:
+        await _export_list(message, "accounts", fmt)
+        return
+    text, markup = await _build_list_page("accounts")
+    if text is None:
+        await message.answer(_LISTS["accounts"][3])
         return
+    # Страницы списков — массовый вывод: уступают очередь ответам на команды
+    send_scheduler.enqueue(message.answer(text, parse_mode="HTML", reply_markup=markup), BULK)
 
-    response = "<b>Список аккаунтов:</b>\n"
-    for acc in accounts:
-        response += f"- {acc.messenger_type.capitalize()} (Person ID: <code>{acc.person_id}</code>): "
-        if acc.telegram_id:
-            response += f"Telegram ID=<code>{acc.telegram_id}</code>, Tag=<code>{acc.telegram_tag or 'нет'}</code>, "
-        if acc.phone_number:
-            response += f"Phone=<code>{acc.phone_number}</code>, "
-        if acc.whatsapp_id:
-            response += f"WhatsApp ID=<code>{acc.whatsapp_id}</code>, "
-        if acc.email:
-            response += f"Email=<code>{acc.email}</code>"
-        response += "\n"
 
-    await message.answer(response, parse_mode="HTML")
+@router.callback_query(PageCallback.filter())
+async def list_page_callback(callback: CallbackQuery, callback_data: PageCallback):
+    if callback_data.entity not in _LISTS:
+        await callback.answer()
+        return
+    text, markup = await _build_list_page(callback_data.entity, callback_data.cursor, callback_data.backward)
+    if text is None:
+        await callback.answer("Больше записей нет")
+        return
+    send_scheduler.enqueue(callback.message.edit_text(text, parse_mode="HTML", reply_markup=markup), BULK)
+    await callback.answer()
 
 
 @router.message(Command("add_person"))
@@ -101,7 +357,7 @@ async def add_person_command(message: Message):
     middle_name = args[3] if len(args) > 3 else None
     description = args[4] if len(args) > 4 else None
 
-    person_id = accounts_db.add_person(last_name, first_name, middle_name, description)
+    person_id = await accounts_db.add_person(last_name, first_name, middle_name, description)
     if person_id:
         await message.answer(f"Человек добавлен с ID <code>{person_id}</code>", parse_mode="HTML")
     else:
@@ -125,7 +381,7 @@ async def add_account_command(message: Message):
             key, value = param.split("=", 1)
             kwargs[key] = value
 
-        if accounts_db.add_account(
+        if await accounts_db.add_account(
                 person_id=person_id,
                 messenger_type=messenger_type,
                 telegram_id=int(kwargs.get("id")) if kwargs.get("id") else None,
@@ -142,7 +398,7 @@ async def add_account_command(message: Message):
     except ValueError:
         await message.answer("Person ID должен быть числом")
     except Exception as e:
-        await message.answer(f"Ошибка при добавлении аккаунта: {str(e)}", parse_mode="HTML")
+        await message.answer(f"Ошибка при добавлении аккаунта: {html.escape(str(e))}", parse_mode="HTML")
 
 
 @router.message(Command("delete_person"))
@@ -154,7 +410,7 @@ async def delete_person_command(message: Message):
 
     try:
         person_id = int(args[1])
-        if accounts_db.delete_person(person_id):
+        if await accounts_db.delete_person(person_id):
             await message.answer(f"Человек с ID <code>{person_id}</code> и связанные аккаунты удалены",
                                  parse_mode="HTML")
         else:
@@ -172,7 +428,7 @@ async def delete_account_command(message: Message):
 
     try:
         account_id = int(args[1])
-        if accounts_db.delete_account(account_id):
+        if await accounts_db.delete_account(account_id):
             await message.answer(f"Аккаунт с ID <code>{account_id}</code> удален", parse_mode="HTML")
         else:
             await message.answer(f"Аккаунт с ID <code>{account_id}</code> не найден", parse_mode="HTML")
@@ -1,7 +1,10 @@
+import html
+
 from aiogram import Router, F
 from aiogram.enums import ChatType
 from aiogram.types import Message
 
+from app.bot.forwards import forward_collector, origin_line
 from app.bot.keyboards.kbd import get_persistent_keyboard
 
 router = Router()
@@ -15,12 +18,12 @@ async def handle_chat_shared(message: Message):
     if request_id == 1:  # Канал
         await message.answer(
             f"✅ Выбран канал с ID: <code>{chat_id}</code>",
-            reply_markup=get_persistent_keyboard()
+            reply_markup=get_persistent_keyboard(message.chat.id)
         )
     elif request_id == 2:  # Группа/супергруппа
         await message.answer(
             f"✅ Выбрана группа с ID: <code>{chat_id}</code>",
-            reply_markup=get_persistent_keyboard()
+            reply_markup=get_persistent_keyboard(message.chat.id)
         )
 
 
@@ -32,58 +35,66 @@ async def handle_user_shared(message: Message):
     if request_id == 3:  # Пользователь
         await message.answer(
             f"✅ Выбран пользователь с ID: <code>{user_id}</code>",
-            reply_markup=get_persistent_keyboard()
+            reply_markup=get_persistent_keyboard(message.chat.id)
         )
     elif request_id == 4:  # Бот
         await message.answer(
             f"✅ Выбран бот с ID: <code>{user_id}</code>",
-            reply_markup=get_persistent_keyboard()
+            reply_markup=get_persistent_keyboard(message.chat.id)
         )
 
 
-@router.message(F.forward_from | F.forward_from_chat | F.forward_origin)
-async def handle_forwarded(message: Message):
+def _describe_forward(message: Message):
+    """(ключ отправителя, подробный текст, строка сводки) или None, если отправитель неизвестен"""
     if message.forward_from:
-        await message.answer(
+        user = message.forward_from
+        return ("user", user.id), (
             f"🔁 <b>Переслано от пользователя:</b>\n"
-            f"ID: <code>{message.forward_from.id}</code>\n"
-            f"Имя: {message.forward_from.full_name}\n"
-            f"Username: @{message.forward_from.username or '—'}\n"
-            f"Бот: {'Да' if message.forward_from.is_bot else 'Нет'}",
-            reply_markup=get_persistent_keyboard()
-        )
-    elif message.forward_from_chat:
+            f"ID: <code>{user.id}</code>\n"
+            f"Имя: {html.escape(user.full_name)}\n"
+            f"Username: @{html.escape(user.username or '—')}\n"
+            f"Бот: {'Да' if user.is_bot else 'Нет'}"
+        ), origin_line("🤖" if user.is_bot else "👤", user.full_name, user.id)
+    if message.forward_from_chat:
         chat = message.forward_from_chat
         chat_type = "канала" if chat.type == ChatType.CHANNEL else "группы"
-        await message.answer(
+        return ("chat", chat.id), (
             f"🔁 <b>Переслано из {chat_type}:</b>\n"
             f"ID: <code>{chat.id}</code>\n"
             f"Тип: <code>{chat.type}</code>\n"
-            f"Название: {chat.title or 'Нет данных'}\n"
-            f"Username: @{chat.username or 'Нет данных'}",
-            reply_markup=get_persistent_keyboard()
-        )
-    elif message.forward_origin:
-        origin = message.forward_origin
-        if origin.type == "user":
-            await message.answer(
-                f"🔁 <b>Переслано от пользователя:</b>\n"
-                f"ID: <code>{origin.sender_user.id}</code>\n"
-                f"Имя: {origin.sender_user.full_name}\n"
-                f"Username: @{origin.sender_user.username or 'Нет данных'}",
-                reply_markup=get_persistent_keyboard()
-            )
-        elif origin.type == "chat":
-            chat_type = "канала" if origin.sender_chat.type == ChatType.CHANNEL else "группы"
-            await message.answer(
-                f"🔁 <b>Переслано из {chat_type}:</b>\n"
-                f"ID: <code>{origin.sender_chat.id}</code>\n"
-                f"Тип: <code>{origin.sender_chat.type}</code>\n"
-                f"Название: {origin.sender_chat.title or 'Нет данных'}",
-                reply_markup=get_persistent_keyboard()
-            )
-        elif origin.type == "hidden_user":
-            await message.answer(
-                f"🔁 <b>Переслано от скрытого пользователя:</b> {origin.sender_user_name}",
-                reply_markup=get_persistent_keyboard()
-            )
+            f"Название: {html.escape(chat.title or 'Нет данных')}\n"
+            f"Username: @{html.escape(chat.username or 'Нет данных')}"
+        ), origin_line("📢", chat.title, chat.id)
+    origin = message.forward_origin
+    if origin is None:
+        return None
+    if origin.type == "user":
+        user = origin.sender_user
+        return ("user", user.id), (
+            f"🔁 <b>Переслано от пользователя:</b>\n"
+            f"ID: <code>{user.id}</code>\n"
+            f"Имя: {html.escape(user.full_name)}\n"
+            f"Username: @{html.escape(user.username or 'Нет данных')}"
+        ), origin_line("👤", user.full_name, user.id)
+    if origin.type in ("chat", "channel"):
+        chat = origin.sender_chat if origin.type == "chat" else origin.chat
+        chat_type = "канала" if chat.type == ChatType.CHANNEL else "группы"
+        return ("chat", chat.id), (
+            f"🔁 <b>Переслано из {chat_type}:</b>\n"
+            f"ID: <code>{chat.id}</code>\n"
+            f"Тип: <code>{chat.type}</code>\n"
+            f"Название: {html.escape(chat.title or 'Нет данных')}"
+        ), origin_line("📢", chat.title, chat.id)
+    if origin.type == "hidden_user":
+        return ("hidden", origin.sender_user_name), (
+            f"🔁 <b>Переслано от скрытого пользователя:</b> {html.escape(origin.sender_user_name)}"
+        ), origin_line("🙈", origin.sender_user_name, None)
+    return None
+
+
+@router.message(F.forward_from | F.forward_from_chat | F.forward_origin)
+async def handle_forwarded(message: Message):
+    # Ответ уходит один на пачку пересылок, после короткой паузы (app/bot/forwards.py)
+    described = _describe_forward(message)
+    if described:
+        forward_collector.add(message, *described)
@@ -20,5 +20,5 @@ async def help_handler(message: Message):
         "1. Нажми /id чтобы увидеть свой ID\n"
         "2. Перешли мне сообщение\n"
         "3. Используй кнопки ниже",
-        reply_markup=get_persistent_keyboard()
+        reply_markup=get_persistent_keyboard(message.chat.id, force=True)
     )
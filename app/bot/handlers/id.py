@@ -14,5 +14,5 @@ async def id_command(message: Message):
         f"👤 <b>Ваш ID:</b> <code>{message.from_user.id}</code>\n"
         f"💬 <b>Текущий чат:</b> <code>{message.chat.id}</code>\n"
         f"Тип: {message.chat.type}",
-        reply_markup=get_persistent_keyboard()
+        reply_markup=get_persistent_keyboard(message.chat.id)
     )
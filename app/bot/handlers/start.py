@@ -17,5 +17,5 @@ async def start_handler(message: Message):
         f"/help - справка по боту\n\n"
         f"Можешь переслать сообщение и получить информацию\n"
         f"Или выбери, что показать через встроенную клавиатуру",
-        reply_markup=get_persistent_keyboard()
+        reply_markup=get_persistent_keyboard(message.chat.id, force=True)
     )
@@ -1,7 +1,18 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, KeyboardButtonRequestChat, KeyboardButtonRequestUser
+from collections import OrderedDict
 
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, KeyboardButtonRequestChat, KeyboardButtonRequestUser, \
+    InlineKeyboardMarkup, InlineKeyboardButton
 
-def get_persistent_keyboard():
+
+class PageCallback(CallbackData, prefix="page"):
+    """Навигация по спискам: entity — persons/accounts, cursor — граничный id страницы"""
+    entity: str
+    cursor: int
+    backward: bool
+
+
+def _build_persistent_keyboard():
     return ReplyKeyboardMarkup(
         keyboard=[
             [
@@ -25,3 +36,45 @@ def get_persistent_keyboard():
         is_persistent=True,
         one_time_keyboard=False
     )
+
+
+# Клавиатура неизменна: собираем и валидируем модель один раз на весь процесс
+PERSISTENT_KEYBOARD = _build_persistent_keyboard()
+
+# Чаты, где постоянная клавиатура уже показана (LRU, чтобы память не росла бесконечно)
+KEYBOARD_TRACK_LIMIT = 10000
+_keyboard_shown = OrderedDict()
+
+
+def get_persistent_keyboard(chat_id=None, force=False):
+    """Постоянная клавиатура — общий готовый экземпляр.
+
+    Если передан chat_id, клавиатура возвращается только при первом ответе в этот чат,
+    дальше None: is_persistent-клавиатура уже висит у пользователя, и reply_markup можно
+    не отправлять. force=True отдает клавиатуру в любом случае (/start, /help).
+    """
+    if chat_id is None:
+        return PERSISTENT_KEYBOARD
+    if chat_id in _keyboard_shown:
+        _keyboard_shown.move_to_end(chat_id)
+        if not force:
+            return None
+    else:
+        _keyboard_shown[chat_id] = True
+        if len(_keyboard_shown) > KEYBOARD_TRACK_LIMIT:
+            _keyboard_shown.popitem(last=False)
+    return PERSISTENT_KEYBOARD
+
+
+def get_pagination_keyboard(entity, first_id, last_id, has_prev, has_next):
+    """Кнопки «назад/вперёд» для страницы списка, None если листать некуда"""
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            text="◀️ Назад", callback_data=PageCallback(entity=entity, cursor=first_id, backward=True).pack()))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            text="Вперёд ▶️", callback_data=PageCallback(entity=entity, cursor=last_id, backward=False).pack()))
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
@@ -0,0 +1,51 @@
+import time
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.metrics import HANDLER_DURATION, UPDATES_TOTAL, UPDATES_IN_PROGRESS
+
+
+def _labels(data: Dict[str, Any]):
+    """Роутер и команда для меток: берутся из найденного хендлера, а не из текста,
+    чтобы произвольные /команды пользователей не раздували число меток"""
+    handler = data.get("handler")
+    router = handler.callback.__module__.rsplit('.', 1)[-1] if handler else "-"
+    command = data.get("command")
+    if command is not None:
+        return router, command.command
+    callback_data = data.get("callback_data")
+    if callback_data is not None:
+        return router, callback_data.__prefix__
+    return router, "-"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Мидлварь метрик: время обработки по роутеру и команде, отказы белого списка,
+    число апдейтов в обработке. Регистрируется перед WhitelistMiddleware, чтобы видеть ее отказы"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        UPDATES_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            if data.get("access_denied"):
+                status = "denied"
+            elif data.get("throttled"):
+                status = "throttled"
+            else:
+                status = "ok"
+            return result
+        finally:
+            UPDATES_IN_PROGRESS.dec()
+            router, command = _labels(data)
+            UPDATES_TOTAL.inc(router, command, status)
+            if status == "ok":
+                HANDLER_DURATION.observe(time.perf_counter() - started, router, command)
@@ -0,0 +1,160 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Message, CallbackQuery
+from loguru import logger
+
+from app.config import settings
+
+# Классы команд: у каждого свой бакет, чтобы поиск не отнимал лимит у /id
+HEAVY_COMMANDS = {"find_phone", "find", "find_linked", "find_file", "list_persons", "list_accounts", "list", "check"}
+WRITE_COMMANDS = {"add", "remove", "add_person", "add_account", "delete_person", "delete_account"}
+
+# Предельное число бакетов: при переполнении вытесняются самые давние
+MAX_BUCKETS = 100_000
+# Сколько помнить решение по альбому (media_group_id): его части приходят отдельными апдейтами подряд
+MEDIA_GROUP_TTL = 60
+
+
+def command_class(data: Dict[str, Any]) -> str:
+    """heavy — запросы к базе с чтением многих строк, write — изменения, cheap — остальное"""
+    if data.get("callback_data") is not None:  # листание страниц списков
+        return "heavy"
+    command = data.get("command")
+    name = command.command if command is not None else None
+    if name in HEAVY_COMMANDS:
+        return "heavy"
+    if name in WRITE_COMMANDS:
+        return "write"
+    return "cheap"
+
+
+def is_forward(message: Message) -> bool:
+    """Пересланное сообщение: ответы на них уже объединяет ForwardCollector (app/bot/forwards.py)"""
+    return bool(message.forward_origin or message.forward_from or message.forward_from_chat)
+
+
+class TokenBucket:
+    """Бакет: capacity токенов, пополняется со скоростью rate в секунду"""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "notified")
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+        # Пользователю уже ответили «подождите» в текущей серии отказов
+        self.notified = False
+
+    def consume(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        return (1 - self.tokens) / self.rate
+
+    def is_expired(self, now: float) -> bool:
+        """Бакет полностью пополнился — он ничем не отличается от нового, его можно удалить"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Мидлварь: ограничение частоты запросов пользователя по классам команд (token bucket).
+
+    Регистрируется после WhitelistMiddleware, чтобы бакеты заводились только для пользователей
+    с доступом. На серию отказов пользователь получает один ответ «подождите», остальные
+    сообщения серии молча отбрасываются. Пересылки не ограничиваются: на пачку пересылок
+    уходит один ответ. Альбом (media_group_id) тратит один токен, остальные его части
+    пропускаются или отбрасываются вместе с первой.
+    """
+
+    def __init__(self, limits: Dict[str, tuple] = None, exempt_super_admin: bool = None,
+                 max_buckets: int = MAX_BUCKETS):
+        self.limits = limits or {
+            "heavy": (settings.THROTTLE_HEAVY_RATE, settings.THROTTLE_HEAVY_BURST),
+            "write": (settings.THROTTLE_WRITE_RATE, settings.THROTTLE_WRITE_BURST),
+            "cheap": (settings.THROTTLE_CHEAP_RATE, settings.THROTTLE_CHEAP_BURST),
+        }
+        if exempt_super_admin is None:
+            exempt_super_admin = settings.THROTTLE_EXEMPT_SUPER_ADMIN
+        self.exempt_super_admin = exempt_super_admin
+        self.max_buckets = max_buckets
+        # (user_id, класс) -> TokenBucket в порядке последнего обращения
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        # (chat_id, media_group_id) -> (когда пришла первая часть, пропущена ли она) в порядке прихода
+        self._media_groups: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def _evict(self, now: float):
+        """Удалить давно не использованные бакеты: они в начале словаря, проверка амортизированно O(1)"""
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if len(self._buckets) <= self.max_buckets and not bucket.is_expired(now):
+                break
+            self._buckets.popitem(last=False)
+        while self._media_groups:
+            seen, _ = next(iter(self._media_groups.values()))
+            if len(self._media_groups) <= self.max_buckets and now - seen < MEDIA_GROUP_TTL:
+                break
+            self._media_groups.popitem(last=False)
+
+    def _bucket(self, key: tuple, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, capacity = self.limits[key[1]]
+            bucket = self._buckets[key] = TokenBucket(rate, capacity, now)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if not user or (self.exempt_super_admin and user.id == settings.SUPER_ADMIN_ID):
+            return await handler(event, data)
+
+        media_group = None
+        if isinstance(event, Message):
+            if is_forward(event):
+                return await handler(event, data)
+            if event.media_group_id:
+                media_group = (event.chat.id, event.media_group_id)
+
+        now = time.monotonic()
+        self._evict(now)
+        if media_group in self._media_groups:
+            # Следующие части альбома разделяют решение по первой
+            if self._media_groups[media_group][1]:
+                return await handler(event, data)
+            data["throttled"] = True
+            return
+
+        kind = command_class(data)
+        bucket = self._bucket((user.id, kind), now)
+        allowed = bucket.consume(now)
+        if media_group is not None:
+            self._media_groups[media_group] = (now, allowed)
+        if allowed:
+            bucket.notified = False
+            return await handler(event, data)
+
+        data["throttled"] = True
+        if bucket.notified:
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return
+        bucket.notified = True
+        logger.warning(f"Превышен лимит запросов: user_id={user.id}, класс={kind}")
+        text = f"⏳ Слишком много запросов, повторите через {math.ceil(bucket.retry_after())} сек."
+        if isinstance(event, (Message, CallbackQuery)):
+            await event.answer(text)
@@ -1,3 +1,6 @@
+import asyncio
+import time
+from collections import Counter
 from typing import Callable, Dict, Any, Awaitable
 
 from aiogram import BaseMiddleware
@@ -7,10 +10,73 @@ from loguru import logger
 from app.config import settings
 from db import db
 
+# Сколько пользователей перечислять в сводке отказов
+TOP_OFFENDERS = 5
+
+
+class DenialReport:
+    """Сводка отказов в доступе вместо строки лога на каждый апдейт.
+
+    Отказы копятся в окне interval секунд; первые sample_size отказов окна
+    логируются по отдельности, остальные попадают только в сводку. Сводка
+    за прошедшее окно пишется по его окончании фоновой задачей (start/stop,
+    регистрируются на старт и остановку диспетчера) или при первом отказе
+    после окончания окна, если задача не запущена.
+    """
+
+    def __init__(self, interval: float = 60, sample_size: int = 3):
+        self.interval = interval
+        self.sample_size = sample_size
+        self._counts = Counter()
+        self._total = 0
+        self._started = time.monotonic()
+        self._task = None
+
+    async def start(self):
+        """Запустить периодическую запись сводки"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        """Остановить периодическую запись и записать сводку за неполное окно"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(max(0.0, self._started + self.interval - time.monotonic()))
+            if time.monotonic() - self._started >= self.interval:
+                self.flush()
+
+    def record(self, user_id: int):
+        now = time.monotonic()
+        if now - self._started >= self.interval:
+            self.flush(now)
+        self._counts[user_id] += 1
+        self._total += 1
+        if self._total <= self.sample_size:
+            logger.warning(f"Доступ запрещен: user_id={user_id}")
+
+    def flush(self, now: float = None):
+        """Записать сводку за текущее окно и начать новое"""
+        now = time.monotonic() if now is None else now
+        if self._total > self.sample_size:
+            top = ", ".join(f"{user_id} ({count})" for user_id, count in self._counts.most_common(TOP_OFFENDERS))
+            logger.warning(f"Отказов в доступе за {now - self._started:.0f} сек: {self._total} "
+                           f"от {len(self._counts)} пользователей, чаще всего: {top}")
+        self._counts.clear()
+        self._total = 0
+        self._started = now
+
 
 class WhitelistMiddleware(BaseMiddleware):
     """Мидлварь: доступ только для whitelisted + суперадмин всегда имеет доступ"""
 
+    def __init__(self):
+        self.denials = DenialReport(interval=settings.DENIAL_REPORT_INTERVAL)
+
     async def __call__(
             self,
             handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -19,13 +85,15 @@ class WhitelistMiddleware(BaseMiddleware):
     ) -> Any:
         user = data.get("event_from_user")
         if not user:
+            data["access_denied"] = True
             return
 
         if user.id == settings.SUPER_ADMIN_ID:
             return await handler(event, data)
 
-        if not db.is_user_whitelisted(user.id):
-            logger.warning(f"Доступ запрещен: user_id={user.id}")
+        if not await db.is_user_whitelisted(user.id):
+            self.denials.record(user.id)
+            data["access_denied"] = True
             return
 
         return await handler(event, data)
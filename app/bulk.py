@@ -0,0 +1,139 @@
+"""Потоковая загрузка и выгрузка persons, accounts и whitelist в CSV/JSONL.
+
+Примеры:
+    python app/bulk.py import persons persons.csv
+    python app/bulk.py import accounts accounts.jsonl --batch-size 10000
+    python app/bulk.py export whitelist whitelist.csv
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем корень проекта в sys.path для корректного импорта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from loguru import logger
+
+from db.database import AsyncDatabase as WhitelistDatabase
+from db.database_new import AsyncDatabase as AccountsDatabase
+from db.transfer import FIELDS, PARSERS, RowError, RowWriter, detect_format, read_rows
+
+# Сколько отклонённых строк выводить подробно, дальше только счётчик
+MAX_REPORTED_ERRORS = 20
+
+
+def _open_database(table):
+    return WhitelistDatabase() if table == "whitelist" else AccountsDatabase()
+
+
+async def _insert_batch(database, table, batch):
+    """Записать пачку одной транзакцией, вернуть отклонённые базой строки (row, причина)"""
+    if table == "persons":
+        return await database.bulk_insert_persons(batch)
+    if table == "accounts":
+        return await database.bulk_insert_accounts(batch)
+    return await database.bulk_add_users(batch)
+
+
+def _log_progress(table, count, started):
+    elapsed = time.monotonic() - started
+    rate = count / elapsed if elapsed else 0
+    logger.info(f"{table}: {count} строк, {rate:.0f} строк/с")
+
+
+async def import_file(table, path, fmt, batch_size):
+    """Загрузить файл пачками по batch_size; возвращает число отклонённых строк"""
+    parse = PARSERS[table]
+    database = _open_database(table)
+    await database.create_tables()
+    started = time.monotonic()
+    inserted, rejected = 0, 0
+
+    def reject(line_num, reason):
+        nonlocal rejected
+        rejected += 1
+        if rejected <= MAX_REPORTED_ERRORS:
+            logger.warning(f"Строка {line_num} отклонена: {reason}")
+
+    async def flush(batch, lines):
+        nonlocal inserted
+        failed = {id(row): reason for row, reason in await _insert_batch(database, table, batch)}
+        for row, line_num in zip(batch, lines):
+            if id(row) in failed:
+                reject(line_num, failed[id(row)])
+        inserted += len(batch) - len(failed)
+        _log_progress(table, inserted, started)
+
+    try:
+        with open(path, newline='', encoding='utf-8') as fh:
+            batch, lines = [], []
+            for line_num, row in read_rows(fh, fmt):
+                try:
+                    if isinstance(row, RowError):
+                        raise row
+                    batch.append(parse(row))
+                    lines.append(line_num)
+                except RowError as e:
+                    reject(line_num, e)
+                    continue
+                if len(batch) >= batch_size:
+                    await flush(batch, lines)
+                    batch, lines = [], []
+            if batch:
+                await flush(batch, lines)
+    finally:
+        await database.close()
+
+    if rejected > MAX_REPORTED_ERRORS:
+        logger.warning(f"... и ещё {rejected - MAX_REPORTED_ERRORS} отклонённых строк")
+    logger.info(f"Импорт {table} завершён: загружено {inserted}, отклонено {rejected} "
+                f"за {time.monotonic() - started:.1f} с")
+    return rejected
+
+
+async def export_file(table, path, fmt, batch_size):
+    """Выгрузить таблицу в файл, читая базу потоково по batch_size строк"""
+    database = _open_database(table)
+    await database.create_tables()
+    started = time.monotonic()
+    count = 0
+    try:
+        with open(path, 'w', newline='', encoding='utf-8') as fh:
+            writer = RowWriter(fh, fmt, FIELDS[table])
+            if table == "whitelist":
+                rows = database.iter_users(batch_size)
+            else:
+                rows = database.iter_rows(table, batch_size)
+            async for row in rows:
+                writer.write(row)
+                count += 1
+                if count % batch_size == 0:
+                    _log_progress(table, count, started)
+    finally:
+        await database.close()
+    logger.info(f"Экспорт {table} завершён: {count} строк в {path} за {time.monotonic() - started:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка и выгрузка данных в CSV/JSONL")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("table", choices=list(FIELDS))
+    parser.add_argument("path", help="путь к файлу .csv или .jsonl")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="формат файла (по умолчанию по расширению)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="строк в одной транзакции")
+    args = parser.parse_args()
+
+    try:
+        fmt = detect_format(args.path, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.action == "import":
+        rejected = asyncio.run(import_file(args.table, args.path, fmt, args.batch_size))
+        sys.exit(1 if rejected else 0)
+    asyncio.run(export_file(args.table, args.path, fmt, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -6,6 +7,83 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     BOT_TOKEN: str
     SUPER_ADMIN_ID: int
+    # Период пересинхронизации кэша белого списка с базой, сек (0 — без пересинхронизации)
+    WHITELIST_CACHE_TTL: int = 300
+    # Сколько секунд помнить отказ пользователю не из белого списка и сколько таких отказов хранить
+    DENIED_CACHE_TTL: int = 60
+    DENIED_CACHE_SIZE: int = 10000
+    # Период сводки отказов в доступе в логе, сек
+    DENIAL_REPORT_INTERVAL: int = 60
+    # Кэш результатов /find и /find_phone: записей и срок жизни, сек (0 — без кэша)
+    LOOKUP_CACHE_SIZE: int = 1024
+    LOOKUP_CACHE_TTL: int = 300
+    # /find_linked: наибольшая глубина обхода и размер результата
+    LINKED_MAX_DEPTH: int = 3
+    LINKED_MAX_PERSONS: int = 50
+    LINKED_MAX_ACCOUNTS: int = 300
+    # /find_file: наибольшее число идентификаторов в присланном файле
+    FIND_FILE_MAX_ITEMS: int = 10000
+
+    # Логи: уровень по умолчанию и уровни отдельных модулей ("db=WARNING,app.bot.handlers.find=DEBUG")
+    LOG_LEVEL: str = "INFO"
+    LOG_MODULE_LEVELS: str = ""
+    # text — цветной текст для консоли, json — одна JSON-строка на запись
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    # Файл логов (пусто — только stdout), ротация и срок хранения в формате loguru ("50 MB", "7 days")
+    LOG_FILE: str = ""
+    LOG_ROTATION: str = "50 MB"
+    LOG_RETENTION: str = "7 days"
+    # Не больше LOG_SAMPLE_LIMIT записей ниже WARNING с одного места в коде за LOG_SAMPLE_INTERVAL сек (0 — без ограничения)
+    LOG_SAMPLE_LIMIT: int = 20
+    LOG_SAMPLE_INTERVAL: float = 10.0
+
+    # Адрес своего сервера Bot API (telegram-bot-api); пусто — api.telegram.org
+    BOT_API_URL: str = ""
+
+    # Получение апдейтов: polling (по умолчанию) или webhook
+    RUN_MODE: Literal["polling", "webhook"] = "polling"
+    # Публичный https-адрес бота без пути; если пуст, вебхук в Telegram не регистрируется
+    # (удобно для локальной проверки POST-запросами на WEBHOOK_HOST:WEBHOOK_PORT)
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    # Значение заголовка X-Telegram-Bot-Api-Secret-Token, запросы без него отклоняются
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    # Сколько апдейтов обрабатывается одновременно; сверх лимита ответ Telegram задерживается
+    WEBHOOK_MAX_CONCURRENT_UPDATES: int = 100
+
+    # Число процессов-обработчиков. Больше 1 — основной процесс только получает апдейты
+    # и распределяет их по процессам по ID пользователя
+    WORKERS: int = 1
+
+    # Период обслуживания баз (PRAGMA optimize и checkpoint WAL), сек; 0 — не обслуживать
+    DB_MAINTENANCE_INTERVAL: int = 3600
+
+    # Ответ на пересланные сообщения: ждем FORWARD_DEBOUNCE сек без новых пересылок,
+    # но не дольше FORWARD_MAX_WAIT, и отвечаем одним сообщением на всю пачку
+    FORWARD_DEBOUNCE: float = 1.0
+    FORWARD_MAX_WAIT: float = 5.0
+
+    # Ограничение частоты запросов на пользователя: пополнение токенов в секунду и размер запаса.
+    # heavy — поиск и списки, write — изменения баз, cheap — остальные команды
+    THROTTLE_HEAVY_RATE: float = 0.5
+    THROTTLE_HEAVY_BURST: int = 5
+    THROTTLE_WRITE_RATE: float = 1.0
+    THROTTLE_WRITE_BURST: int = 10
+    THROTTLE_CHEAP_RATE: float = 3.0
+    THROTTLE_CHEAP_BURST: int = 20
+    THROTTLE_EXEMPT_SUPER_ADMIN: bool = True
+
+    # Исходящие сообщения: не больше SEND_GLOBAL_RATE в секунду на бота и не чаще одного
+    # за SEND_CHAT_INTERVAL (личный чат) или SEND_GROUP_INTERVAL (группа, канал) секунд на чат
+    SEND_GLOBAL_RATE: float = 30
+    SEND_CHAT_INTERVAL: float = 1.0
+    SEND_GROUP_INTERVAL: float = 3.0
+
+    # Метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics (0 — выключено)
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9100
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
@@ -0,0 +1,76 @@
+"""Поиск и объединение людей-дубликатов в accounts.db.
+
+Примеры:
+    python app/dedup.py report
+    python app/dedup.py report --limit 100
+    python app/dedup.py merge 17 42 108    # аккаунты 42 и 108 переходят к 17, сами 42 и 108 удаляются
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем корень проекта в sys.path для корректного импорта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from loguru import logger
+
+from db.database_new import AsyncDatabase
+
+
+def _person_name(person):
+    return " ".join(filter(None, [person.last_name, person.first_name, person.middle_name]))
+
+
+async def report(limit):
+    """Вывести кластеры дубликатов, самые большие первыми"""
+    database = AsyncDatabase()
+    await database.create_tables()
+    try:
+        started = time.monotonic()
+        clusters = await database.find_duplicate_clusters()
+        logger.info(f"Найдено кластеров: {len(clusters)} за {time.monotonic() - started:.1f} с")
+        shown = clusters[:limit]
+        persons = await database.get_persons([person_id for cluster in shown for person_id in cluster.person_ids])
+    finally:
+        await database.close()
+
+    for number, cluster in enumerate(shown, 1):
+        print(f"Кластер {number}: {len(cluster.person_ids)} чел.")
+        for person_id in cluster.person_ids:
+            person = persons.get(person_id)
+            print(f"  {person_id}: {_person_name(person) if person else '—'}")
+        print("  Общие: " + ", ".join(f"{kind}={value}" for kind, value in cluster.identifiers))
+    if len(clusters) > limit:
+        print(f"... и ещё {len(clusters) - limit} кластеров")
+
+
+async def merge(target_id, person_ids):
+    """Объединить людей в target_id; True при успехе"""
+    database = AsyncDatabase()
+    await database.create_tables()
+    try:
+        return await database.merge_persons(target_id, person_ids) is not None
+    finally:
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск и объединение людей-дубликатов")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    report_parser = subparsers.add_parser("report", help="показать кластеры людей с общими идентификаторами")
+    report_parser.add_argument("--limit", type=int, default=50, help="сколько кластеров выводить")
+    merge_parser = subparsers.add_parser("merge", help="объединить людей в первого из списка")
+    merge_parser.add_argument("target_id", type=int, help="ID человека, который остается")
+    merge_parser.add_argument("person_ids", type=int, nargs="+", help="ID людей, которые вливаются в target_id")
+    args = parser.parse_args()
+
+    if args.action == "report":
+        asyncio.run(report(args.limit))
+        return
+    sys.exit(0 if asyncio.run(merge(args.target_id, args.person_ids)) else 1)
+
+
+if __name__ == '__main__':
+    main()
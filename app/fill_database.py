@@ -36,20 +36,17 @@ def clear_and_fill_database():
     # Очищаем базу
     if current_users:
         logger.info("Очищаем базу...")
-        for user in current_users:
-            db.remove_user(user.user_id)
-        logger.info(f"Удалено {len(current_users)} пользователей")
+        removed, _ = db.remove_users([user.user_id for user in current_users])
+        logger.info(f"Удалено {len(removed)} пользователей")
 
     # Добавляем новых пользователей
     new_users = [439716429]
     logger.info(f"Добавляем {len(new_users)} новых пользователей:")
-    added_count = 0
-    for user_id in new_users:
-        if db.add_user(user_id):
-            logger.info(f"   Добавлен: {user_id}")
-            added_count += 1
-        else:
-            logger.error(f"   Ошибка с: {user_id}")
+    added, existing = db.add_users(new_users)
+    for user_id in added:
+        logger.info(f"   Добавлен: {user_id}")
+    for user_id in existing:
+        logger.error(f"   Ошибка с: {user_id}")
 
     # Показываем итог
     final_users = db.get_all_users()
@@ -75,13 +72,11 @@ def add_users_without_clear():
     # Добавляем новых пользователей
     new_users = [439716429]
     logger.info(f"Добавляем {len(new_users)} пользователей:")
-    added_count = 0
-    for user_id in new_users:
-        if db.add_user(user_id):
-            logger.info(f"   Добавлен: {user_id}")
-            added_count += 1
-        else:
-            logger.warning(f"   Уже существует: {user_id}")
+    added, existing = db.add_users(new_users)
+    for user_id in added:
+        logger.info(f"   Добавлен: {user_id}")
+    for user_id in existing:
+        logger.warning(f"   Уже существует: {user_id}")
 
     # Итог
     final_users = db.get_all_users()
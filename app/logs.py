@@ -0,0 +1,138 @@
+"""Настройка loguru по Settings.
+
+Запись в stdout и файл идет через очередь (enqueue=True): вызов logger.* только
+форматирует строку и кладет ее в очередь, запись делает отдельный поток, так что
+медленный stdout или диск не блокируют цикл событий. Уровни задаются по модулям,
+частые сообщения ниже WARNING прореживаются: с одного места в коде проходит не
+больше LOG_SAMPLE_LIMIT записей за LOG_SAMPLE_INTERVAL секунд, о пропущенных
+сообщает следующая прошедшая запись.
+"""
+import json
+import sys
+import time
+import traceback
+
+from loguru import logger
+
+TEXT_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level}</level> | <cyan>{message}</cyan>"
+FILE_TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level} | {name}:{line} | {message}"
+# Записи этого уровня и выше не прореживаются
+SAMPLING_MAX_LEVEL = 30  # WARNING
+
+
+def parse_module_levels(value: str) -> dict:
+    """'db=WARNING,app.bot.handlers.find=DEBUG' -> {'db': 'WARNING', 'app.bot.handlers.find': 'DEBUG'}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        module, _, level = item.partition("=")
+        levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+class LogFilter:
+    """Уровни по модулям (самый длинный совпавший префикс имени модуля) и прореживание"""
+
+    def __init__(self, level: str, module_levels: dict, sample_limit: int, sample_interval: float):
+        self.default_level = logger.level(level).no
+        # Длинные префиксы проверяются первыми
+        self.module_levels = sorted(((module, logger.level(name).no) for module, name in module_levels.items()),
+                                    key=lambda item: -len(item[0]))
+        self.sample_limit = sample_limit
+        self.sample_interval = sample_interval
+        # (модуль, строка) -> [начало окна, прошло записей, пропущено]
+        self._sites = {}
+        # Фильтр общий для всех обработчиков: решение о прореживании принимается один раз на запись
+        self._last_record = None
+        self._last_sampled = True
+
+    @property
+    def min_level(self) -> int:
+        return min([self.default_level] + [level for _, level in self.module_levels])
+
+    def _level_for(self, name: str) -> int:
+        for module, level in self.module_levels:
+            if name == module or name.startswith(module + "."):
+                return level
+        return self.default_level
+
+    def __call__(self, record) -> bool:
+        level = record["level"].no
+        if level < self._level_for(record["name"] or ""):
+            return False
+        if not self.sample_limit or level >= SAMPLING_MAX_LEVEL:
+            return True
+        if record is not self._last_record:
+            self._last_record = record
+            self._last_sampled = self._sample(record)
+        return self._last_sampled
+
+    def _sample(self, record) -> bool:
+        now = time.monotonic()
+        site = self._sites.get((record["name"], record["line"]))
+        if site is None or now - site[0] >= self.sample_interval:
+            dropped = site[2] if site else 0
+            self._sites[(record["name"], record["line"])] = [now, 1, 0]
+            if dropped:
+                record["extra"]["sampled_out"] = dropped
+            return True
+        if site[1] < self.sample_limit:
+            site[1] += 1
+            return True
+        site[2] += 1
+        return False
+
+
+def _json_format(record) -> str:
+    """Одна JSON-строка на запись; loguru подставляет готовую строку из extra"""
+    payload = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "module": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    extra = {key: value for key, value in record["extra"].items() if key != "json"}
+    if extra:
+        payload["extra"] = extra
+    if record["exception"]:
+        exc_type, exc_value, exc_traceback = record["exception"]
+        payload["exception"] = "".join(traceback.format_exception(exc_type, exc_value, exc_traceback))
+    record["extra"]["json"] = json.dumps(payload, ensure_ascii=False, default=str)
+    return "{extra[json]}\n"
+
+
+def _text_format(template: str):
+    def format_record(record) -> str:
+        suffix = " (пропущено похожих: {extra[sampled_out]})" if "sampled_out" in record["extra"] else ""
+        return template + suffix + "\n{exception}"
+    return format_record
+
+
+def setup_logging(settings):
+    """Заменить обработчики loguru на настроенные в Settings"""
+    log_filter = LogFilter(settings.LOG_LEVEL, parse_module_levels(settings.LOG_MODULE_LEVELS),
+                           settings.LOG_SAMPLE_LIMIT, settings.LOG_SAMPLE_INTERVAL)
+    json_output = settings.LOG_FORMAT == "json"
+
+    logger.remove()
+    logger.add(
+        sys.stdout,
+        level=log_filter.min_level,
+        filter=log_filter,
+        format=_json_format if json_output else _text_format(TEXT_FORMAT),
+        colorize=not json_output,
+        enqueue=True,
+    )
+    if settings.LOG_FILE:
+        logger.add(
+            settings.LOG_FILE,
+            level=log_filter.min_level,
+            filter=log_filter,
+            format=_json_format if json_output else _text_format(FILE_TEXT_FORMAT),
+            rotation=settings.LOG_ROTATION or None,
+            retention=settings.LOG_RETENTION or None,
+            compression="gz",
+            encoding="utf-8",
+            enqueue=True,
+        )
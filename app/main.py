@@ -1,65 +1,92 @@
 import asyncio
+import hashlib
+import json
 import os
 import sys
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand, BotCommandScopeDefault
 
 # Добавляем корень проекта в sys.path для корректного импорта
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from app.bot.forwards import forward_collector
 from app.bot.handlers import start, help, id, get_shared, any_message, database_command, find
+from app.bot.middlewares.metrics import MetricsMiddleware
+from app.bot.middlewares.throttling import ThrottlingMiddleware
 from app.bot.middlewares.white_list import WhitelistMiddleware
 from app.config import settings
+from app.logs import setup_logging
+from app.metrics import instrument_engine, start_metrics_server, watch_lookup_cache
+from app.sender import send_scheduler
+from app.sharding import run_sharded
+from app.webhook import run_webhook
 from db import db
+from db.database_new import new_db_instance as accounts_db
+from db.sqlite import data_path, maintenance_loop
 
 from loguru import logger
 
-# Удаляем все существующие обработчики перед добавлением
-logger.remove()
-
-# Также выводим логи в консоль с цветами
-logger.add(
-    sys.stdout,
-    level="INFO",
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level}</level> | <cyan>{message}</cyan>",
-    colorize=True
-)
+setup_logging(settings)
+
+
+BOT_COMMANDS = [
+    BotCommand(command="start", description="Запустить бота"),
+    BotCommand(command="help", description="Помощь"),
+    BotCommand(command="id", description="Получить ID"),
+    BotCommand(command="add", description="Добавить в белый список"),
+    BotCommand(command="remove", description="Удалить из белого списка"),
+    BotCommand(command="list", description="Показать белый список"),
+    BotCommand(command="check", description="Проверить доступ"),
+    BotCommand(command="find_phone", description="Найти по номеру телефона"),
+    BotCommand(command="find", description="Найти по ID, тегу, email или WhatsApp"),
+    BotCommand(command="find_file", description="Найти по списку из файла"),
+    BotCommand(command="find_linked", description="Найти всех, кто связан с идентификатором"),
+    BotCommand(command="list_persons", description="Показать список людей"),
+    BotCommand(command="list_accounts", description="Показать список аккаунтов"),
+    BotCommand(command="add_person", description="Добавить человека"),
+    BotCommand(command="add_account", description="Добавить аккаунт"),
+    BotCommand(command="delete_person", description="Удалить человека"),
+    BotCommand(command="delete_account", description="Удалить аккаунт"),
+]
+
+# Хэш последнего установленного списка команд, чтобы не вызывать set_my_commands на каждом запуске
+COMMANDS_HASH_FILE = "bot_commands.sha256"
 
 
 async def set_bot_commands(bot: Bot):
-    """Установка команд меню бота"""
-    commands = [
-        BotCommand(command="start", description="Запустить бота"),
-        BotCommand(command="help", description="Помощь"),
-        BotCommand(command="id", description="Получить ID"),
-        BotCommand(command="add", description="Добавить в белый список"),
-        BotCommand(command="remove", description="Удалить из белого списка"),
-        BotCommand(command="list", description="Показать белый список"),
-        BotCommand(command="check", description="Проверить доступ"),
-        BotCommand(command="find_phone", description="Найти по номеру телефона"),
-        BotCommand(command="list_persons", description="Показать список людей"),
-        BotCommand(command="list_accounts", description="Показать список аккаунтов"),
-        BotCommand(command="add_person", description="Добавить человека"),
-        BotCommand(command="add_account", description="Добавить аккаунт"),
-        BotCommand(command="delete_person", description="Удалить человека"),
-        BotCommand(command="delete_account", description="Удалить аккаунт"),
-    ]
-
-    await bot.set_my_commands(commands=commands, scope=BotCommandScopeDefault())
+    """Установка команд меню бота, если список изменился с прошлого запуска"""
+    payload = json.dumps([command.model_dump() for command in BOT_COMMANDS], ensure_ascii=False, sort_keys=True)
+    commands_hash = hashlib.sha256(f"{bot.id}:{payload}".encode()).hexdigest()
+    hash_path = data_path(COMMANDS_HASH_FILE)
+    try:
+        with open(hash_path) as fh:
+            if fh.read().strip() == commands_hash:
+                logger.debug("Команды бота не изменились")
+                return
+    except FileNotFoundError:
+        pass
+
+    await bot.set_my_commands(commands=BOT_COMMANDS, scope=BotCommandScopeDefault())
+    os.makedirs(os.path.dirname(hash_path), exist_ok=True)
+    with open(hash_path, "w") as fh:
+        fh.write(commands_hash)
     logger.success("Команды бота установлены")
 
 
-async def main():
-    # Настройка бота
-    bot = Bot(token=settings.BOT_TOKEN,
-              default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+def create_dispatcher() -> Dispatcher:
+    """Собрать диспетчер: мидлвари и роутеры в рабочем порядке"""
     dp = Dispatcher()
 
-    # Устанавливаем команды меню
-    await set_bot_commands(bot)
+    # Мидлварь метрик идет первой: она замеряет всю цепочку и видит отказы белого списка
+    metrics_middleware = MetricsMiddleware()
+    dp.message.middleware(metrics_middleware)
+    dp.callback_query.middleware(metrics_middleware)
+    dp.edited_message.middleware(metrics_middleware)
 
     # Инициализируем мидлварь
     whitelist_middleware = WhitelistMiddleware()
@@ -67,6 +94,11 @@ async def main():
     dp.callback_query.middleware(whitelist_middleware)
     dp.edited_message.middleware(whitelist_middleware)
 
+    # Ограничение частоты запросов — после белого списка и перед хендлерами
+    throttling_middleware = ThrottlingMiddleware()
+    dp.message.middleware(throttling_middleware)
+    dp.callback_query.middleware(throttling_middleware)
+
     # Подключаем роутеры
     dp.include_routers(
         database_command.router,  # должен быть первым
@@ -78,39 +110,114 @@ async def main():
         any_message.router
     )
 
-    # ----------------- Логирование при старте -----------------
+    # Базы подключаются при старте диспетчера, а не при импорте
+    dp.startup.register(setup_databases)
+    dp.startup.register(whitelist_middleware.denials.start)
+    dp.shutdown.register(forward_collector.flush_all)
+    dp.shutdown.register(whitelist_middleware.denials.stop)
+    dp.shutdown.register(close_databases)
+    return dp
+
+
+def create_bot() -> Bot:
+    """Бот с HTML по умолчанию; все исходящие запросы в чаты идут через планировщик с лимитами Telegram"""
+    session = None
+    if settings.BOT_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.BOT_API_URL))
+    bot = Bot(token=settings.BOT_TOKEN, session=session,
+              default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(send_scheduler)
+    return bot
+
+
+async def setup_databases():
+    """Создать таблицы и загрузить белый список в кэш, дальше проверки доступа идут без запросов к базе"""
+    await db.create_tables()
+    await accounts_db.create_tables()
+    db.whitelist_cache.ttl = settings.WHITELIST_CACHE_TTL
+    db.whitelist_cache.denied_ttl = settings.DENIED_CACHE_TTL
+    db.whitelist_cache.denied_limit = settings.DENIED_CACHE_SIZE
+    await db.whitelist_cache.reload()
+    accounts_db.lookup_cache.maxsize = settings.LOOKUP_CACHE_SIZE
+    accounts_db.lookup_cache.ttl = settings.LOOKUP_CACHE_TTL
+
+    # Время SQL-запросов обеих баз и попадания в кэш поиска
+    instrument_engine(db.engine, "whitelist")
+    instrument_engine(accounts_db.engine, "accounts")
+    watch_lookup_cache(accounts_db.lookup_cache)
+
+
+async def close_databases():
+    await db.close()
+    await accounts_db.close()
+
+
+async def announce_startup(bot: Bot):
+    """Команды меню и сводка при старте основного процесса"""
+    await set_bot_commands(bot)
+
     logger.info("🚀 Бот успешно запущен")
     logger.info("=" * 50)
     logger.info(f"🤖 BOT_TOKEN: {'*' * 10 + settings.BOT_TOKEN[-5:]}")
     logger.info(f"⭐ SUPER_ADMIN_ID: {settings.SUPER_ADMIN_ID}")
 
-    all_users = db.get_all_users()
-    logger.info(f"📋 Пользователей в белом списке: {len(all_users)}")
+    users_count = await db.count_users()
+    logger.info(f"📋 Пользователей в белом списке: {users_count}")
 
-    if all_users:
+    if users_count:
         logger.info("Первые пользователи в базе:")
-        for user in all_users[:10]:
+        for user in await db.get_all_users(limit=10):
             username_display = user.username or 'N/A'
             logger.info(f"   👤 {user.user_id} | {username_display}")
-        if len(all_users) > 10:
-            logger.info(f"   ... и ещё {len(all_users) - 10} пользователей")
+        if users_count > 10:
+            logger.info(f"   ... и ещё {users_count - 10} пользователей")
 
     logger.info(f"⚙️  Parse mode: {ParseMode.HTML}")
+    logger.info(f"📡 Режим получения апдейтов: {settings.RUN_MODE}")
+    if settings.WORKERS > 1:
+        logger.info(f"🧩 Процессов-обработчиков: {settings.WORKERS}")
     logger.info("=" * 50)
 
-    # Удаляем старый вебхук
-    await bot.delete_webhook(drop_pending_updates=True)
-    logger.debug("Старый вебхук удален")
+
+async def main():
+    # Настройка бота
+    bot = create_bot()
+    dp = create_dispatcher()
+    # После подключения баз: команды меню и сводка в лог
+    dp.startup.register(announce_startup)
+
+    metrics_runner = None
+    if settings.METRICS_PORT:
+        metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    maintenance = None
+    if settings.DB_MAINTENANCE_INTERVAL:
+        maintenance = asyncio.create_task(
+            maintenance_loop([db, accounts_db], settings.DB_MAINTENANCE_INTERVAL))
 
     try:
-        logger.info("Начинаем поллинг...")
-        await dp.start_polling(bot)
+        if settings.WORKERS > 1:
+            await run_sharded(bot, dp, settings.WORKERS)
+        elif settings.RUN_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # Удаляем старый вебхук
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.debug("Старый вебхук удален")
+            logger.info("Начинаем поллинг...")
+            await dp.start_polling(bot)
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {e}")
         raise
     finally:
+        if maintenance:
+            maintenance.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await send_scheduler.close()
         await bot.session.close()
         logger.info("Сессия бота закрыта")
+        # Дописать записи, оставшиеся в очереди логов
+        await logger.complete()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,201 @@
+"""Метрики бота в формате Prometheus без внешних зависимостей.
+
+Счетчики, gauge и гистограммы хранятся в памяти процесса и отдаются текстом
+по GET /metrics на локальном порту (METRICS_HOST:METRICS_PORT).
+"""
+import re
+import time
+import weakref
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+from aiohttp import web
+from loguru import logger
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+
+class FunctionCounter(Counter):
+    """Счетчик, значения которого при выдаче берутся из function() -> {метки: значение}"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = None
+
+    def render(self):
+        if self.function is not None:
+            self._values = dict(self.function())
+        return super().render()
+
+
+class FunctionGauge(FunctionCounter):
+    type_name = "gauge"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по бакетам (последний — +Inf), сумма]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_DURATION = REGISTRY.register(Histogram(
+    "bot_handler_duration_seconds", "Время обработки апдейта хендлером", labels=("router", "command")))
+UPDATES_TOTAL = REGISTRY.register(Counter(
+    "bot_updates_total", "Обработанные апдейты по итогу: ok, denied, throttled, error",
+    labels=("router", "command", "status")))
+UPDATES_IN_PROGRESS = REGISTRY.register(Gauge(
+    "bot_updates_in_progress", "Апдейты, которые сейчас в обработке"))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    "bot_db_query_duration_seconds", "Время выполнения SQL-запроса", labels=("database", "operation", "table")))
+LOOKUP_CACHE_REQUESTS = REGISTRY.register(FunctionCounter(
+    "bot_lookup_cache_requests_total", "Поиски по идентификатору: hit — ответ из кэша, miss — запрос к базе",
+    labels=("result",)))
+LOOKUP_CACHE_ENTRIES = REGISTRY.register(FunctionGauge(
+    "bot_lookup_cache_entries", "Записей в кэше результатов поиска"))
+
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+"?(\w+)', re.IGNORECASE)
+
+
+def _describe_statement(statement: str):
+    """Операция и основная таблица запроса — метки с ограниченным числом значений"""
+    parts = statement.lstrip().split(None, 1)
+    operation = parts[0].upper() if parts else "-"
+    match = _TABLE_RE.search(statement)
+    return operation, match.group(1) if match else "-"
+
+
+_instrumented = weakref.WeakSet()
+
+
+def instrument_engine(engine, database: str):
+    """Повесить замер времени каждого SQL-запроса на движок (sync или async); повторный вызов ничего не делает"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine in _instrumented:
+        return
+    _instrumented.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            DB_QUERY_DURATION.observe(time.perf_counter() - started, database, *_describe_statement(statement))
+
+
+def watch_lookup_cache(cache):
+    """Отдавать счетчики кэша поиска (db.database_new.LookupCache) в метриках"""
+    LOOKUP_CACHE_REQUESTS.function = lambda: {("hit",): cache.hits, ("miss",): cache.misses}
+    LOOKUP_CACHE_ENTRIES.function = lambda: {(): len(cache)}
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднять HTTP-сервер с GET /metrics; вернуть runner для остановки через cleanup()"""
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,57 @@
+"""Миграции схемы баз данных (те же, что применяются при старте бота).
+
+Примеры:
+    python app/migrate.py              # применить к обеим базам
+    python app/migrate.py accounts
+    python app/migrate.py --status     # только показать версии
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Добавляем корень проекта в sys.path для корректного импорта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from loguru import logger
+
+from db import database, database_new
+from db.migrations import schema_version
+
+# имя -> (класс базы, список миграций)
+DATABASES = {
+    "whitelist": (database.AsyncDatabase, database.MIGRATIONS),
+    "accounts": (database_new.AsyncDatabase, database_new.MIGRATIONS),
+}
+
+
+async def migrate(names, status_only):
+    for name in names:
+        database_class, migrations = DATABASES[name]
+        instance = database_class()
+        latest = max((migration.version for migration in migrations), default=0)
+        try:
+            if not status_only:
+                # create_tables создает недостающие таблицы и применяет миграции
+                await instance.create_tables()
+            else:
+                instance.connect()
+            version = await schema_version(instance.engine)
+        finally:
+            await instance.close()
+        logger.info(f"{name}: версия схемы {version} из {latest}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы баз данных")
+    parser.add_argument("databases", nargs="*", help=f"базы: {', '.join(DATABASES)} (по умолчанию все)")
+    parser.add_argument("--status", action="store_true", help="только показать текущие версии")
+    args = parser.parse_args()
+    unknown = set(args.databases) - set(DATABASES)
+    if unknown:
+        parser.error(f"неизвестные базы: {', '.join(sorted(unknown))}")
+    asyncio.run(migrate(args.databases or list(DATABASES), args.status))
+
+
+if __name__ == '__main__':
+    main()
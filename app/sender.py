@@ -0,0 +1,171 @@
+"""Планировщик исходящих запросов к Bot API.
+
+Подключается к сессии бота как request-мидлварь и выпускает запросы, адресованные
+чату (sendMessage, editMessageText, sendDocument…), не чаще глобального лимита и
+лимита на чат. Ответы на команды идут раньше массового вывода (списков): приоритет
+берется из контекстной переменной send_priority. При 429 выдерживается retry_after
+и запрос повторяется.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from loguru import logger
+
+from app.config import settings
+
+INTERACTIVE = 0
+BULK = 1
+
+send_priority: ContextVar[int] = ContextVar("send_priority", default=INTERACTIVE)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    def __init__(self, global_rate: float, chat_interval: float, group_interval: float, max_retries: int = 3):
+        self.global_interval = 1 / global_rate if global_rate > 0 else 0
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.max_retries = max_retries
+        self._seq = itertools.count()
+        # chat_id -> куча ожидающих (приоритет, номер, future)
+        self._queues = {}
+        # Чаты, недавно получившие сообщение: chat_id -> когда можно следующее
+        self._cooldown_until = {}
+        self._cooling = []  # куча (время, номер, chat_id)
+        self._ready = []  # куча (приоритет, номер, chat_id) для чатов без паузы
+        self._next_send = 0.0
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._worker = None
+        self._tasks = set()
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        priority = send_priority.get()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Лимит Telegram: пауза {e.retry_after} сек перед повтором {method.__api_method__}")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+
+    def enqueue(self, coro, priority: int = INTERACTIVE) -> asyncio.Task:
+        """Отправить в фоне: хендлер не ждет очереди, ошибки отправки только логируются"""
+        task = asyncio.ensure_future(self._send_later(coro, priority))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def close(self, timeout: float = 10):
+        """Дождаться фоновых отправок и остановить планировщик"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+    @staticmethod
+    async def _send_later(coro, priority):
+        # У задачи своя копия контекста, приоритет не влияет на вызвавший хендлер
+        send_priority.set(priority)
+        try:
+            return await coro
+        except Exception as e:
+            logger.error(f"Ошибка фоновой отправки: {e}")
+
+    def _interval(self, chat_id) -> float:
+        # Группы и каналы (отрицательный ID или @username) ограничены строже личных чатов
+        if isinstance(chat_id, str) or chat_id < 0:
+            return self.group_interval
+        return self.chat_interval
+
+    async def _acquire(self, chat_id, priority):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._queues.setdefault(chat_id, []), entry)
+        if chat_id not in self._cooldown_until:
+            heapq.heappush(self._ready, (priority, entry[1], chat_id))
+        self._wakeup.set()
+        await future
+
+    def _live_queue(self, chat_id):
+        """Очередь чата без отмененных запросов в голове; None, если она опустела"""
+        queue = self._queues.get(chat_id)
+        while queue and queue[0][2].done():  # ожидавший запрос отменен
+            heapq.heappop(queue)
+        if not queue:
+            self._queues.pop(chat_id, None)
+            return None
+        return queue
+
+    def _pick(self):
+        """Самый приоритетный запрос среди чатов без паузы; устаревшие записи кучи пропускаются"""
+        while self._ready:
+            priority, seq, chat_id = heapq.heappop(self._ready)
+            if chat_id in self._cooldown_until:
+                continue  # чат на паузе вернется в кучу по ее окончании
+            queue = self._live_queue(chat_id)
+            if queue is None:
+                continue
+            if queue[0][:2] != (priority, seq):
+                # Голова очереди сменилась (запрос отменен или пришел более срочный):
+                # без записи для новой головы чат ждал бы вечно
+                heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+                continue
+            return chat_id
+        return None
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._cooling and self._cooling[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._cooling)
+                del self._cooldown_until[chat_id]
+                queue = self._live_queue(chat_id)
+                if queue:
+                    heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+
+            chat_id = self._pick()
+            if chat_id is None:
+                self._wakeup.clear()
+                timeout = self._cooling[0][0] - now if self._cooling else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = max(self._next_send, self._paused_until) - now
+            if delay > 0:
+                # Вернуть запрос в кучу: за время паузы может прийти более срочный
+                queue = self._queues[chat_id]
+                heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+                await asyncio.sleep(delay)
+                continue
+
+            queue = self._queues[chat_id]
+            heapq.heappop(queue)[2].set_result(None)
+            if not queue:
+                del self._queues[chat_id]
+            self._next_send = now + self.global_interval
+            self._cooldown_until[chat_id] = now + self._interval(chat_id)
+            heapq.heappush(self._cooling, (self._cooldown_until[chat_id], next(self._seq), chat_id))
+
+
+send_scheduler = SendScheduler(
+    global_rate=settings.SEND_GLOBAL_RATE,
+    chat_interval=settings.SEND_CHAT_INTERVAL,
+    group_interval=settings.SEND_GROUP_INTERVAL,
+)
@@ -0,0 +1,240 @@
+"""Обработка апдейтов в нескольких процессах (WORKERS > 1).
+
+Основной процесс получает апдейты поллингом или вебхуком, не разбирая их в
+объекты aiogram, и раскладывает по процессам-обработчикам по ID пользователя:
+все апдейты одного пользователя попадают в один процесс и обрабатываются в нем
+по порядку. Каждый обработчик поднимает свой Bot и Dispatcher из app.main, базы
+SQLite в режиме WAL общие.
+
+Изменения белого списка и аккаунтов в одном процессе доходят до остальных через
+общий счетчик поколений: увидев новое значение, процесс сбрасывает свои кэши.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from loguru import logger
+
+from app.config import settings
+
+POLLING_TIMEOUT = 30
+# Поля апдейта с автором: как в aiogram, from у сообщений и колбэков, user у ответов на опросы
+_USER_FIELDS = ("from", "user")
+
+
+def shard_key(update: dict) -> int:
+    """ID пользователя апдейта (или чата, если автора нет) без разбора апдейта в объекты aiogram"""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        for field in _USER_FIELDS:
+            user = event.get(field)
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return 0
+
+
+class _Frontend:
+    """Раздача апдейтов процессам-обработчикам"""
+
+    def __init__(self, workers: int):
+        context = multiprocessing.get_context("spawn")
+        self.generation = context.Value("q", 0)
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.processes = [
+            context.Process(target=_worker_process, args=(index, workers, queue, self.generation),
+                            name=f"worker-{index}", daemon=True)
+            for index, queue in enumerate(self.queues)
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        logger.info(f"Запущено процессов-обработчиков: {len(self.processes)}")
+
+    def dispatch(self, update: dict):
+        self.queues[shard_key(update) % len(self.queues)].put(update)
+
+    def stop(self, timeout: float = 30):
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} не завершился за {timeout} сек, останавливаем принудительно")
+                process.terminate()
+
+
+async def _poll(bot: Bot, frontend: _Frontend, allowed_updates):
+    """Long polling getUpdates; апдейты остаются словарями и сразу уходят в очереди обработчиков"""
+    url = bot.session.api.api_url(token=bot.token, method="getUpdates")
+    params = {"timeout": str(POLLING_TIMEOUT), "allowed_updates": json.dumps(allowed_updates)}
+    offset = 0
+    timeout = aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        while True:
+            try:
+                async with http.post(url, data={**params, "offset": str(offset)}) as response:
+                    payload = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.error(f"Ошибка getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not payload.get("ok"):
+                retry_after = (payload.get("parameters") or {}).get("retry_after", 1)
+                logger.error(f"getUpdates вернул ошибку: {payload.get('description')}")
+                await asyncio.sleep(retry_after)
+                continue
+            for update in payload["result"]:
+                offset = update["update_id"] + 1
+                frontend.dispatch(update)
+
+
+async def _serve_webhook(bot: Bot, frontend: _Frontend, allowed_updates):
+    """Прием вебхука: ответ Telegram сразу после постановки апдейта в очередь"""
+    async def handle(request: web.Request) -> web.Response:
+        if settings.WEBHOOK_SECRET and \
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.WEBHOOK_SECRET:
+            return web.Response(status=401)
+        frontend.dispatch(await request.json())
+        return web.Response()
+
+    if not settings.WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET не задан: запросы на вебхук принимаются без проверки")
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT).start()
+    logger.info(f"Вебхук слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+    if settings.WEBHOOK_URL:
+        await bot.set_webhook(
+            url=settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+            allowed_updates=allowed_updates,
+            max_connections=100,
+            drop_pending_updates=True,
+        )
+        logger.info(f"Вебхук зарегистрирован: {settings.WEBHOOK_URL}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_sharded(bot: Bot, dp: Dispatcher, workers: int):
+    """Получать апдейты в этом процессе и обрабатывать их в workers процессах"""
+    # Подключение баз и миграции — один раз здесь, до запуска обработчиков
+    await dp.emit_startup(bot=bot)
+    frontend = _Frontend(workers)
+    frontend.start()
+    # Типы апдейтов, на которые есть хендлеры, — у обработчиков тот же набор роутеров
+    allowed_updates = dp.resolve_used_update_types()
+    try:
+        if settings.RUN_MODE == "webhook":
+            await _serve_webhook(bot, frontend, allowed_updates)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Начинаем поллинг...")
+            await _poll(bot, frontend, allowed_updates)
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, frontend.stop)
+        await dp.emit_shutdown(bot=bot)
+
+
+class _PerUserOrder:
+    """Апдейты одного пользователя обрабатываются строго по очереди, разных — параллельно"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot):
+        self.dp = dp
+        self.bot = bot
+        self._tails = {}
+        self.tasks = set()
+
+    def submit(self, update: dict):
+        key = shard_key(update)
+        task = asyncio.ensure_future(self._feed(self._tails.get(key), update))
+        self._tails[key] = task
+        self.tasks.add(task)
+        task.add_done_callback(lambda done: self._done(key, done))
+
+    def _done(self, key, task):
+        self.tasks.discard(task)
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def _feed(self, previous, update):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception as e:
+            logger.exception(f"Ошибка обработки апдейта {update.get('update_id')}: {e}")
+
+
+def _worker_process(index: int, workers: int, queue, generation):
+    # Останавливает обработчик сигнал None из основного процесса, Ctrl+C его не прерывает
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(index, workers, queue, generation))
+
+
+async def _worker_main(index: int, workers: int, queue, generation):
+    # app.main импортирует этот модуль, поэтому импорт здесь, а не в начале файла
+    from app.main import create_bot, create_dispatcher
+    from app.metrics import start_metrics_server
+    from app.sender import send_scheduler
+    from db import db
+    from db.database_new import new_db_instance as accounts_db
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot)
+    metrics_runner = None
+    if settings.METRICS_PORT:
+        metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT + 1 + index)
+
+    # Лимит Telegram на бота общий для всех процессов, делим его поровну
+    send_scheduler.global_interval *= workers
+
+    seen = generation.value
+
+    def on_change():
+        nonlocal seen
+        with generation.get_lock():
+            generation.value += 1
+            if generation.value == seen + 1:
+                seen = generation.value
+
+    db.whitelist_cache.on_change = on_change
+    accounts_db.lookup_cache.on_change = on_change
+    order = _PerUserOrder(dp, bot)
+    loop = asyncio.get_running_loop()
+    logger.info(f"Обработчик {index} (pid {os.getpid()}) готов")
+    try:
+        while True:
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+            if generation.value != seen:
+                seen = generation.value
+                db.whitelist_cache.invalidate()
+                accounts_db.lookup_cache.clear()
+            order.submit(update)
+        if order.tasks:
+            await asyncio.wait(list(order.tasks))
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await send_scheduler.close()
+        await bot.session.close()
+        await dp.emit_shutdown(bot=bot)
+        logger.info(f"Обработчик {index} остановлен")
+        await logger.complete()
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+
+from app.config import settings
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler с ограничением числа одновременно обрабатываемых апдейтов.
+
+    Пока лимит исчерпан, ответ на очередной POST задерживается до освобождения
+    слота. Telegram не присылает больше max_connections апдейтов без ответа,
+    поэтому нагрузка не копится в памяти процесса.
+    """
+
+    def __init__(self, *args: Any, max_concurrent_updates: int = 100, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        await self._slots.acquire()
+        try:
+            return await super()._handle_request_background(bot, request)
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        try:
+            await super()._background_feed_update(bot, update)
+        finally:
+            self._slots.release()
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    """aiohttp-приложение, принимающее апдейты на WEBHOOK_PATH"""
+    app = web.Application()
+    BoundedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.WEBHOOK_SECRET or None,
+        max_concurrent_updates=settings.WEBHOOK_MAX_CONCURRENT_UPDATES,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Запустить веб-сервер и (если задан WEBHOOK_URL) зарегистрировать вебхук в Telegram"""
+    if not settings.WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET не задан: запросы на вебхук принимаются без проверки")
+
+    runner = web.AppRunner(create_webhook_app(bot, dp))
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Вебхук слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+
+    if settings.WEBHOOK_URL:
+        await bot.set_webhook(
+            url=settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(settings.WEBHOOK_MAX_CONCURRENT_UPDATES, 100),
+            drop_pending_updates=True,
+        )
+        logger.info(f"Вебхук зарегистрирован: {settings.WEBHOOK_URL}")
+    else:
+        logger.warning("WEBHOOK_URL не задан: вебхук в Telegram не регистрируется")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,137 @@
+"""Бенчмарк многопроцессной обработки (WORKERS > 1) с разным числом процессов.
+
+Для каждого числа обработчиков из --workers поднимает основной процесс из
+app.sharding (поллинг локальной замены Bot API) и процессы-обработчики, прогоняет
+одни и те же апдейты и считает апдейты/с до последнего ответа бота. Перед замером
+каждый обработчик прогревается одним апдейтом, так что запуск процессов в замер
+не входит. Лимиты отправки планировщика на время прогона отключены.
+
+    python benchmarks/bench_sharding.py --workers 1,2,4 --updates 5000
+
+Ускорение ограничено числом ядер машины.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_throughput import (WHITELISTED_BASE, configure_env, generate_updates, make_update,  # noqa: E402
+                              seed_databases)
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+# Только апдейты, на каждый из которых бот отвечает ровно одним sendMessage
+# (на пачку пересылок ответ один, их число ответов заранее не известно)
+MIX = {"id": 4, "find_phone": 2}
+
+
+def configure_sharding_env(port, log_level):
+    os.environ["BOT_API_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["LOG_LEVEL"] = log_level
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["SEND_GLOBAL_RATE"] = "0"
+    os.environ["SEND_CHAT_INTERVAL"] = "0"
+    os.environ["SEND_GROUP_INTERVAL"] = "0"
+
+
+async def wait_for_replies(api, count, timeout):
+    deadline = time.perf_counter() + timeout
+    while api.method_calls["sendMessage"] < count:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"получено {api.method_calls['sendMessage']} ответов из {count}")
+        await asyncio.sleep(0.005)
+    return time.perf_counter()
+
+
+async def run_once(dp, workers, updates, args):
+    import random
+
+    from loguru import logger
+
+    from app.main import create_bot
+    from app.sharding import run_sharded
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    api = FakeBotAPI(port=args.port)
+    await api.start()
+    bot = create_bot()
+    frontend = asyncio.create_task(run_sharded(bot, dp, workers))
+    try:
+        # Прогрев: по апдейту на каждый процесс (ключ шарда — ID пользователя)
+        rnd = random.Random(0)
+        warmup = []
+        for shard in range(workers):
+            update = make_update(shard + 1, "id", rnd, 1, 1)
+            user_id = WHITELISTED_BASE + shard
+            update["message"]["from"]["id"] = update["message"]["chat"]["id"] = user_id
+            warmup.append(update)
+        api.push_updates(warmup)
+        await wait_for_replies(api, len(warmup), args.timeout)
+
+        api.method_calls.clear()
+        api.served_at.clear()
+        # Номера апдейтов должны идти после прогревочных
+        api.push_updates([{**update, "update_id": update["update_id"] + workers} for update in updates])
+        finished = await wait_for_replies(api, len(updates), args.timeout)
+        return finished - min(api.served_at.values())
+    finally:
+        frontend.cancel()
+        try:
+            await frontend
+        except asyncio.CancelledError:
+            pass
+        await bot.session.close()
+        await api.stop()
+
+
+async def seed(args):
+    from db import db
+    from db.database_new import new_db_instance as accounts_db
+
+    try:
+        await seed_databases(db, accounts_db, args.users, args.phones)
+    finally:
+        await db.close()
+        await accounts_db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк многопроцессной обработки апдейтов")
+    parser.add_argument("--workers", default="1,2,4", help="числа процессов-обработчиков через запятую")
+    parser.add_argument("--updates", type=int, default=5000, help="сколько апдейтов прогнать")
+    parser.add_argument("--users", type=int, default=2000, help="пользователей в белом списке")
+    parser.add_argument("--phones", type=int, default=10_000, help="аккаунтов с телефонами в accounts.db")
+    parser.add_argument("--port", type=int, default=8081, help="порт локального Bot API")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=600, help="предельное время одного прогона, с")
+    parser.add_argument("--log-level", default="ERROR", help="уровень логов во время прогона")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="tg_full_id_bench_")
+    configure_env(data_dir)
+    configure_sharding_env(args.port, args.log_level)
+    try:
+        asyncio.run(seed(args))
+        # Роутеры — синглтоны модулей, диспетчер основного процесса один на все прогоны
+        from app.main import create_dispatcher
+        dp = create_dispatcher()
+        updates, _ = generate_updates(args.updates, MIX, args.users, args.phones, args.seed)
+        print(f"Ядер процессора: {os.cpu_count()}, апдейтов: {len(updates)}\n")
+        print(f"{'процессов':<12}{'время, с':>10}{'апдейтов/с':>12}")
+        for workers in [int(value) for value in args.workers.split(",")]:
+            elapsed = asyncio.run(run_once(dp, workers, updates, args))
+            print(f"{workers:<12}{elapsed:>10.2f}{len(updates) / elapsed:>12.0f}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""Сквозной бенчмарк пропускной способности бота.
+
+Гоняет синтетические апдейты через настоящий Dispatcher из app.main (мидлвари,
+порядок роутеров, запросы к SQLite) с локальной заменой Bot API вместо Telegram.
+Базы создаются во временном каталоге (DATA_DIR), рабочие data/*.db не трогаются.
+
+    python benchmarks/bench_throughput.py --updates 5000
+
+Отчет: апдейты/с и задержки p50/p95/p99 по типам апдейтов — от выдачи апдейта
+в getUpdates до завершения его обработки диспетчером.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+BENCH_TOKEN = "123456:BENCHMARK"
+SUPER_ADMIN_ID = 1
+WHITELISTED_BASE = 100_000
+DENIED_BASE = 900_000
+
+# Доли типов апдейтов в потоке по умолчанию
+DEFAULT_MIX = {"id": 4, "forward": 3, "find_phone": 2, "denied": 1}
+
+
+def configure_env(data_dir):
+    """Настройки бота берутся из окружения при импорте, поэтому задаем их до импорта app/db"""
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["BOT_TOKEN"] = BENCH_TOKEN
+    os.environ["SUPER_ADMIN_ID"] = str(SUPER_ADMIN_ID)
+
+
+def make_phone(i):
+    return f"+7999{i:07d}"
+
+
+def make_update(update_id, kind, rnd, users, phones):
+    if kind == "denied":
+        user_id = DENIED_BASE + rnd.randrange(users)
+    else:
+        user_id = WHITELISTED_BASE + rnd.randrange(users)
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+        "text": "/id",
+    }
+    if kind == "find_phone":
+        message["text"] = f"/find_phone {make_phone(rnd.randrange(phones))}"
+    elif kind == "forward":
+        message["text"] = "пересланное сообщение"
+        message["forward_origin"] = {
+            "type": "user",
+            "date": int(time.time()),
+            "sender_user": {"id": rnd.randrange(10 ** 9), "is_bot": False, "first_name": "Origin"},
+        }
+    return {"update_id": update_id, "message": message}
+
+
+def generate_updates(count, mix, users, phones, seed):
+    rnd = random.Random(seed)
+    kinds = rnd.choices(list(mix), weights=list(mix.values()), k=count)
+    updates = [make_update(i + 1, kind, rnd, users, phones) for i, kind in enumerate(kinds)]
+    return updates, {update["update_id"]: kind for update, kind in zip(updates, kinds)}
+
+
+async def seed_databases(db, accounts_db, users, phones):
+    await db.create_tables()
+    await accounts_db.create_tables()
+    await db.add_users([WHITELISTED_BASE + i for i in range(users)])
+    await accounts_db.bulk_insert_persons(
+        [{"id": i + 1, "last_name": f"Фамилия{i}", "first_name": "Имя", "middle_name": None, "description": None}
+         for i in range(phones)])
+    await accounts_db.bulk_insert_accounts(
+        [{"person_id": i + 1, "messenger_type": "telegram", "phone_number": make_phone(i),
+          "phone_normalized": make_phone(i)} for i in range(phones)])
+    await db.whitelist_cache.reload()
+
+
+def percentile_ms(values, q):
+    if len(values) == 1:
+        return values[0] * 1000
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] * 1000
+
+
+def print_report(latencies, elapsed, method_calls):
+    total = sum(len(values) for values in latencies.values())
+    print(f"\nОбработано {total} апдейтов за {elapsed:.2f} с: {total / elapsed:.0f} апдейтов/с")
+    print(f"Исходящие вызовы API: {dict(method_calls)}\n")
+    print(f"{'тип':<12}{'кол-во':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for kind, values in sorted(latencies.items()):
+        print(f"{kind:<12}{len(values):>8}"
+              f"{percentile_ms(values, 50):>10.2f}{percentile_ms(values, 95):>10.2f}{percentile_ms(values, 99):>10.2f}")
+
+
+async def run(args):
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+    from loguru import logger
+
+    from app.main import create_dispatcher
+    from db import db
+    from db.database_new import new_db_instance as accounts_db
+
+    # app.main при импорте настраивает вывод в stdout; в бенчмарке оставляем только заданный уровень
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    await seed_databases(db, accounts_db, args.users, args.phones)
+    updates, kinds = generate_updates(args.updates, DEFAULT_MIX, args.users, args.phones, args.seed)
+
+    api = FakeBotAPI(port=args.port)
+    await api.start()
+    bot = Bot(token=BENCH_TOKEN,
+              session=AiohttpSession(api=TelegramAPIServer.from_base(api.base_url)),
+              default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = create_dispatcher()
+
+    latencies = defaultdict(list)
+    finished = asyncio.Event()
+    last_done = 0.0
+
+    async def measure(handler, event, data):
+        nonlocal last_done
+        try:
+            return await handler(event, data)
+        finally:
+            last_done = time.perf_counter()
+            latencies[kinds[event.update_id]].append(last_done - api.served_at[event.update_id])
+            if sum(len(values) for values in latencies.values()) == len(updates):
+                finished.set()
+
+    dp.update.outer_middleware(measure)
+
+    api.push_updates(updates)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    try:
+        await asyncio.wait_for(finished.wait(), args.timeout)
+    finally:
+        await dp.stop_polling()
+        await polling
+        await bot.session.close()
+        await api.stop()
+        await db.close()
+        await accounts_db.close()
+
+    print_report(latencies, last_done - min(api.served_at.values()), api.method_calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк Dispatcher с локальным Bot API")
+    parser.add_argument("--updates", type=int, default=5000, help="сколько апдейтов прогнать")
+    parser.add_argument("--users", type=int, default=500, help="пользователей в белом списке")
+    parser.add_argument("--phones", type=int, default=10_000, help="аккаунтов с телефонами в accounts.db")
+    parser.add_argument("--port", type=int, default=8081, help="порт локального Bot API")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=600, help="предельное время прогона, с")
+    parser.add_argument("--log-level", default="ERROR", help="уровень логов бота во время прогона")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="tg_full_id_bench_")
+    configure_env(data_dir)
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
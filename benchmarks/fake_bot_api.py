@@ -0,0 +1,92 @@
+"""Локальная замена Telegram Bot API для бенчмарков.
+
+Отдает заранее сгенерированные апдейты через getUpdates (с учетом offset и
+long polling) и принимает sendMessage и остальные исходящие методы, отвечая
+минимальными корректными объектами. Время выдачи каждого апдейта запоминается
+в served_at, чтобы бенчмарк мог посчитать задержку обработки.
+"""
+import asyncio
+import time
+from collections import Counter, deque
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeBotAPI:
+    def __init__(self, host="127.0.0.1", port=8081):
+        self.host = host
+        self.port = port
+        self.served_at = {}
+        self.method_calls = Counter()
+        self._pending = deque()
+        self._has_updates = asyncio.Event()
+        self._message_id = 0
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def push_updates(self, updates):
+        """Поставить апдейты (dict в формате Bot API) в очередь на выдачу"""
+        self._pending.extend(updates)
+        self._has_updates.set()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        self.method_calls[method] += 1
+        params = await request.post()
+        if method == "getUpdates":
+            return self._ok(await self._get_updates(params))
+        if method == "getMe":
+            return self._ok(BOT_USER)
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            return self._ok(self._message(params))
+        return self._ok(True)
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        # Подтвержденные через offset апдейты больше не отдаем
+        while self._pending and self._pending[0]["update_id"] < offset:
+            self._pending.popleft()
+        if not self._pending and timeout:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = [self._pending[i] for i in range(min(limit, len(self._pending)))]
+        now = time.perf_counter()
+        for update in batch:
+            self.served_at.setdefault(update["update_id"], now)
+        return batch
+
+    def _message(self, params):
+        self._message_id += 1
+        chat_id = int(params.get("chat_id") or 0)
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    @staticmethod
+    def _ok(result):
+        return web.json_response({"ok": True, "result": result})
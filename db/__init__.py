@@ -1,4 +1,4 @@
-from .database import db_instance, Database, WhitelistUser
+from .database import db_instance, AsyncDatabase, Database, WhitelistUser
 
 # Делаем основные объекты доступными при импорте модуля db
 db = db_instance
@@ -1,12 +1,18 @@
+import asyncio
 import os
+import time
+from collections import OrderedDict
 
 from loguru import logger
-from sqlalchemy import create_engine, Column, Integer, String, BigInteger
+from sqlalchemy import Column, Integer, String, BigInteger, delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-Base = declarative_base()
+from .migrations import run_migrations
+from .sqlite import apply_profile, chunks, data_path, existing_values, profile_from_env, split_conflicts
 
+Base = declarative_base()
 
 class WhitelistUser(Base):
     __tablename__ = 'whitelist_users'
@@ -18,75 +24,306 @@ class WhitelistUser(Base):
     last_name = Column(String(100))
 
 
-class Database:
-    def __init__(self, db_name='whitelist.db'):
-        # Абсолютный путь к базе в папке data/
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        db_path = os.path.join(base_dir, 'data', db_name)
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.db_path = db_path
-        self.engine = create_engine(f'sqlite:///{self.db_path}', echo=False)
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+# Миграции whitelist.db (db/migrations.py): пока схема совпадает с исходной
+MIGRATIONS = []
+
+
+class WhitelistCache:
+    """Кэш белого списка в памяти: проверка доступа без обращения к базе.
+
+    Загружается один раз через асинхронный loader, изменения через add/discard
+    применяются на месте. Если задан ttl (в секундах), набор периодически
+    перечитывается из базы, чтобы подхватить правки data/whitelist.db в обход бота.
+
+    Отказы запоминаются в отрицательном кэше (denied_ttl секунд, не больше
+    denied_limit записей): повторные апдейты от отклоненного пользователя не ждут
+    перечитывания базы. Добавление пользователя и перезагрузка сбрасывают его отказ.
+
+    on_change, если задан, вызывается после add/discard — так о правке узнают
+    кэши в других процессах.
+    """
+
+    def __init__(self, loader, ttl=None, denied_ttl=60, denied_limit=10000):
+        self._loader = loader
+        self.ttl = ttl
+        self.denied_ttl = denied_ttl
+        self.denied_limit = denied_limit
+        self._users = None
+        self._loaded_at = 0.0
+        self._reload_task = None
+        # user_id -> время истечения отказа, в порядке добавления
+        self._denied = OrderedDict()
+        self.on_change = None
+
+    def _is_stale(self):
+        if self._users is None:
+            return True
+        return bool(self.ttl) and time.monotonic() - self._loaded_at > self.ttl
+
+    async def reload(self):
+        """Перечитать белый список из базы"""
+        self._users = set(await self._loader())
+        self._loaded_at = time.monotonic()
+        self._denied.clear()
+        logger.debug(f"Кэш белого списка загружен: {len(self._users)} пользователей")
+
+    async def _refresh(self):
+        # Одно перечитывание на всех: параллельные проверки ждут уже запущенное
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.ensure_future(self.reload())
+        await self._reload_task
+
+    def _is_denied(self, user_id, now):
+        expires = self._denied.get(user_id)
+        if expires is None:
+            return False
+        if expires > now:
+            return True
+        del self._denied[user_id]
+        return False
+
+    def _remember_denied(self, user_id, now):
+        self._denied.pop(user_id, None)
+        self._denied[user_id] = now + self.denied_ttl
+        # Сначала вытесняются самые старые отказы
+        while len(self._denied) > self.denied_limit:
+            self._denied.popitem(last=False)
+
+    async def contains(self, user_id):
+        now = time.monotonic()
+        if self._is_denied(user_id, now):
+            return False
+        if self._is_stale():
+            await self._refresh()
+        if user_id in self._users:
+            return True
+        if self.denied_ttl:
+            self._remember_denied(user_id, now)
+        return False
+
+    def add(self, user_id):
+        self._denied.pop(user_id, None)
+        if self._users is not None:
+            self._users.add(user_id)
+        if self.on_change:
+            self.on_change()
+
+    def discard(self, user_id):
+        if self._users is not None:
+            self._users.discard(user_id)
+        if self.on_change:
+            self.on_change()
+
+    def invalidate(self):
+        """Сбросить кэш, следующая проверка перечитает базу"""
+        self._users = None
+        self._denied.clear()
+
+
+class AsyncDatabase:
+    """Асинхронный доступ к белому списку (aiosqlite), используется хендлерами бота"""
+
+    def __init__(self, db_name='whitelist.db', cache_ttl=300):
+        # Движок создается в connect(): импорт модуля не трогает диск
+        self.db_name = db_name
+        self.db_path = None
+        self.engine = None
+        self.session_factory = None
+        self.whitelist_cache = WhitelistCache(self.get_whitelist_set, ttl=cache_ttl)
+
+    def connect(self):
+        """Создать движок (один раз); путь к базе берется из DATA_DIR на момент вызова"""
+        if self.engine is not None:
+            return
+        self.db_path = data_path(self.db_name)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.engine = create_async_engine(f'sqlite+aiosqlite:///{self.db_path}', echo=False)
+        # WAL, synchronous, кэш и т.д. для каждого соединения (db/sqlite.py)
+        apply_profile(self.engine, profile_from_env())
+        # expire_on_commit=False: объекты остаются доступны после commit без ленивой подгрузки
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def create_tables(self):
+        """Создать таблицы, если их ещё нет, и применить миграции схемы (MIGRATIONS)"""
+        self.connect()
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(self.engine, MIGRATIONS)
         logger.info(f"База данных подключена: {self.db_path}")
 
-    def add_user(self, user_id, username=None, first_name=None, last_name=None):
+    async def add_user(self, user_id, username=None, first_name=None, last_name=None):
         """Добавить пользователя в белый список"""
         try:
-            existing_user = self.session.query(WhitelistUser).filter_by(user_id=user_id).first()
-            if existing_user:
-                logger.warning(f"Пользователь {user_id} уже существует")
-                return False
-            user = WhitelistUser(
-                user_id=user_id,
-                username=username,
-                first_name=first_name,
-                last_name=last_name
-            )
-            self.session.add(user)
-            self.session.commit()
+            async with self.session_factory() as session:
+                existing_user = await session.scalar(select(WhitelistUser).filter_by(user_id=user_id))
+                if existing_user:
+                    logger.warning(f"Пользователь {user_id} уже существует")
+                    return False
+                session.add(WhitelistUser(
+                    user_id=user_id,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name
+                ))
+                await session.commit()
+            self.whitelist_cache.add(user_id)
             logger.info(f"Добавлен пользователь: {user_id}")
             return True
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при добавлении пользователя {user_id}: {e}")
             return False
 
-    def remove_user(self, user_id):
+    async def remove_user(self, user_id):
         """Удалить пользователя из белого списка"""
         try:
-            user = self.session.query(WhitelistUser).filter_by(user_id=user_id).first()
-            if user:
-                self.session.delete(user)
-                self.session.commit()
-                logger.info(f"Удален пользователь: {user_id}")
-                return True
-            logger.error(f"Пользователь {user_id} не найден")
-            return False
+            async with self.session_factory() as session:
+                user = await session.scalar(select(WhitelistUser).filter_by(user_id=user_id))
+                if not user:
+                    logger.error(f"Пользователь {user_id} не найден")
+                    return False
+                await session.delete(user)
+                await session.commit()
+            self.whitelist_cache.discard(user_id)
+            logger.info(f"Удален пользователь: {user_id}")
+            return True
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при удалении пользователя {user_id}: {e}")
             return False
 
+    async def add_users(self, user_ids):
+        """Добавить несколько пользователей одной транзакцией (INSERT … ON CONFLICT DO NOTHING).
+
+        Возвращает (added, existing) — списки ID в порядке исходного списка.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        table = WhitelistUser.__table__
+        async with self.engine.begin() as conn:
+            existing = set()
+            for chunk in chunks(ids):
+                existing.update((await conn.scalars(select(table.c.user_id).where(table.c.user_id.in_(chunk)))).all())
+            added = [user_id for user_id in ids if user_id not in existing]
+            if added:
+                await conn.execute(sqlite_insert(table).on_conflict_do_nothing(),
+                                   [{"user_id": user_id} for user_id in added])
+        for user_id in added:
+            self.whitelist_cache.add(user_id)
+        logger.info(f"Добавлено пользователей: {len(added)}, уже были: {len(existing)}")
+        return added, [user_id for user_id in ids if user_id in existing]
+
+    async def remove_users(self, user_ids):
+        """Удалить несколько пользователей одной транзакцией (DELETE … WHERE user_id IN (…)).
+
+        Возвращает (removed, missing) — списки ID в порядке исходного списка.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        table = WhitelistUser.__table__
+        async with self.engine.begin() as conn:
+            existing = set()
+            for chunk in chunks(ids):
+                existing.update((await conn.scalars(select(table.c.user_id).where(table.c.user_id.in_(chunk)))).all())
+            removed = [user_id for user_id in ids if user_id in existing]
+            for chunk in chunks(removed):
+                await conn.execute(delete(table).where(table.c.user_id.in_(chunk)))
+        for user_id in removed:
+            self.whitelist_cache.discard(user_id)
+        logger.info(f"Удалено пользователей: {len(removed)}, не найдено: {len(ids) - len(removed)}")
+        return removed, [user_id for user_id in ids if user_id not in existing]
+
+    async def is_user_whitelisted(self, user_id):
+        """Проверить, есть ли пользователь в белом списке (по кэшу, без запроса к базе)"""
+        return await self.whitelist_cache.contains(user_id)
+
+    async def get_all_users(self, limit=None):
+        """Получить всех пользователей из белого списка (или первые limit)"""
+        async with self.session_factory() as session:
+            return (await session.scalars(select(WhitelistUser).order_by(WhitelistUser.id).limit(limit))).all()
+
+    async def count_users(self):
+        """Число пользователей в белом списке"""
+        async with self.session_factory() as session:
+            return await session.scalar(select(func.count()).select_from(WhitelistUser))
+
+    async def get_whitelist_set(self):
+        """Получить белый список как set"""
+        async with self.session_factory() as session:
+            return set((await session.scalars(select(WhitelistUser.user_id))).all())
+
+    async def bulk_add_users(self, rows):
+        """Добавить пачку пользователей одной транзакцией (executemany).
+
+        Возвращает отклоненные строки (row, причина): пользователь уже есть или повторяется в пачке.
+        """
+        table = WhitelistUser.__table__
+        async with self.engine.begin() as conn:
+            existing = await existing_values(conn, table.c.user_id, {row["user_id"] for row in rows})
+            valid, rejected = split_conflicts(rows, "user_id", existing)
+            if valid:
+                await conn.execute(sqlite_insert(table), valid)
+        # Кэш перечитается при следующей проверке доступа
+        self.whitelist_cache.invalidate()
+        return rejected
+
+    async def iter_users(self, batch_size=1000):
+        """Потоково отдавать пользователей белого списка как dict, читая по batch_size"""
+        table = WhitelistUser.__table__
+        async with self.engine.connect() as conn:
+            result = await conn.stream(select(table).order_by(table.c.id).execution_options(yield_per=batch_size))
+            # Пачками: один переход в поток драйвера на batch_size строк, а не на каждую
+            async for partition in result.mappings().partitions():
+                for row in partition:
+                    yield row
+
+    async def close(self):
+        """Закрыть соединения с базой данных; следующий запрос откроет их заново"""
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+class Database:
+    """Синхронная обёртка над AsyncDatabase для скриптов (fill_database.py)"""
+
+    def __init__(self, db_name='whitelist.db'):
+        self._loop = asyncio.new_event_loop()
+        self._db = AsyncDatabase(db_name)
+        self._run(self._db.create_tables())
+        self.db_path = self._db.db_path
+
+    def _run(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    def add_user(self, user_id, username=None, first_name=None, last_name=None):
+        """Добавить пользователя в белый список"""
+        return self._run(self._db.add_user(user_id, username, first_name, last_name))
+
+    def remove_user(self, user_id):
+        """Удалить пользователя из белого списка"""
+        return self._run(self._db.remove_user(user_id))
+
+    def add_users(self, user_ids):
+        """Добавить несколько пользователей одной транзакцией"""
+        return self._run(self._db.add_users(user_ids))
+
+    def remove_users(self, user_ids):
+        """Удалить несколько пользователей одной транзакцией"""
+        return self._run(self._db.remove_users(user_ids))
+
     def is_user_whitelisted(self, user_id):
         """Проверить, есть ли пользователь в белом списке"""
-        user = self.session.query(WhitelistUser).filter_by(user_id=user_id).first()
-        return user is not None
+        return self._run(self._db.is_user_whitelisted(user_id))
 
     def get_all_users(self):
         """Получить всех пользователей из белого списка"""
-        return self.session.query(WhitelistUser).all()
+        return self._run(self._db.get_all_users())
 
     def get_whitelist_set(self):
         """Получить белый список как set"""
-        users = self.get_all_users()
-        return {user.user_id for user in users}
+        return self._run(self._db.get_whitelist_set())
 
     def close(self):
         """Закрыть соединение с базой данных"""
-        self.session.close()
+        self._run(self._db.close())
+        self._loop.close()
 
 
-# Создаем экземпляр базы данных
-db_instance = Database()
+# Создаем экземпляр базы данных (таблицы создаются при старте бота через create_tables)
+db_instance = AsyncDatabase()
@@ -1,9 +1,21 @@
+import asyncio
 import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
 
 from loguru import logger
-from sqlalchemy import create_engine, Column, Integer, String, BigInteger, ForeignKey
+from sqlalchemy import (Column, Integer, String, BigInteger, ForeignKey, bindparam, delete, func, or_,
+                        select, update)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship, selectinload, validates
+
+from .dedup import build_clusters
+from .migrations import Migration, add_column, create_index, run_migrations
+from .normalize import normalize_phone, normalize_tag, normalize_email, normalize_whatsapp, detect_identifier
+from .sqlite import MAX_INTEGER, apply_profile, chunks, data_path, existing_values, profile_from_env, split_conflicts
 
 Base = declarative_base()
 
@@ -24,145 +36,771 @@ class Account(Base):
 
     id = Column(Integer, primary_key=True)
     messenger_type = Column(String(50), nullable=False)
-    telegram_id = Column(BigInteger)
+    telegram_id = Column(BigInteger, index=True)
     telegram_tag = Column(String(100))
+    # Тег без @ в нижнем регистре, по нему идет индексированный поиск
+    telegram_tag_normalized = Column(String(100), index=True)
     phone_number = Column(String(20))
-    whatsapp_id = Column(String(100))
+    # Номер в каноническом виде E.164, по нему идет индексированный поиск
+    phone_normalized = Column(String(20), index=True)
+    whatsapp_id = Column(String(100), index=True)
+    # WhatsApp ID без суффикса @c.us и +, по нему идет индексированный поиск
+    whatsapp_normalized = Column(String(100), index=True)
     email = Column(String(100))
-    person_id = Column(Integer, ForeignKey('persons.id'), nullable=False)
+    # Email в нижнем регистре, по нему идет индексированный поиск
+    email_normalized = Column(String(100), index=True)
+    # Индекс нужен для выборки аккаунтов набора людей (find_linked, удаление человека)
+    person_id = Column(Integer, ForeignKey('persons.id'), nullable=False, index=True)
     person = relationship("Person", back_populates="accounts")
 
+    @validates('phone_number', 'telegram_tag', 'whatsapp_id', 'email')
+    def _sync_normalized(self, key, value):
+        target, normalize = NORMALIZED_COLUMNS[key]
+        setattr(self, target, normalize(value))
+        return value
+
+
+# Исходная колонка -> (нормализованная колонка, функция нормализации)
+NORMALIZED_COLUMNS = {
+    "phone_number": ("phone_normalized", normalize_phone),
+    "telegram_tag": ("telegram_tag_normalized", normalize_tag),
+    "whatsapp_id": ("whatsapp_normalized", normalize_whatsapp),
+    "email": ("email_normalized", normalize_email),
+}
+
+
+class Page(NamedTuple):
+    """Страница выборки по ключу id"""
+    items: list
+    has_prev: bool
+    has_next: bool
+
+
+def _person_to_dict(person):
+    return {
+        "id": person.id,
+        "last_name": person.last_name,
+        "first_name": person.first_name,
+        "middle_name": person.middle_name,
+        "description": person.description
+    }
+
+
+def _account_to_dict(account):
+    return {
+        "id": account.id,
+        "messenger_type": account.messenger_type,
+        "telegram_id": account.telegram_id,
+        "telegram_tag": account.telegram_tag,
+        "phone_number": account.phone_number,
+        "whatsapp_id": account.whatsapp_id,
+        "email": account.email,
+        "person_id": account.person_id
+    }
+
+
+def _number_as_telegram_id(normalized):
+    """Строка цифр как Telegram ID или None, если она не помещается в колонку (BigInteger, int64).
+
+    Такие длинные строки цифр ищутся только как телефон.
+    """
+    value = int(normalized)
+    return value if value <= MAX_INTEGER else None
+
+
+def _identifier_condition(kind, normalized):
+    """Условие поиска по идентификатору, распознанному detect_identifier; каждое — по индексу"""
+    if kind == "number":
+        # Только цифры: это может быть Telegram ID, телефон или WhatsApp ID
+        conditions = [Account.phone_normalized == normalize_phone(normalized),
+                      Account.whatsapp_normalized == normalized]
+        telegram_id = _number_as_telegram_id(normalized)
+        if telegram_id is not None:
+            conditions.append(Account.telegram_id == telegram_id)
+        return or_(*conditions)
+    if kind == "phone":
+        return Account.phone_normalized == normalized
+    if kind == "tag":
+        return Account.telegram_tag_normalized == normalized
+    if kind == "email":
+        return Account.email_normalized == normalized
+    return Account.whatsapp_normalized == normalized
+
+
+def _identifier_atoms(kind, normalized):
+    """Значения колонок, от которых зависит результат поиска (kind, normalized)"""
+    if kind == "number":
+        atoms = {("whatsapp", normalized)}
+        telegram_id = _number_as_telegram_id(normalized)
+        if telegram_id is not None:
+            atoms.add(("telegram_id", telegram_id))
+        phone = normalize_phone(normalized)
+        if phone:
+            atoms.add(("phone", phone))
+        return atoms
+    return {(kind, normalized)}
+
+
+# Тип идентификатора -> индексированная колонка accounts, по которой он ищется
+IDENTIFIER_COLUMNS = {
+    "telegram_id": "telegram_id",
+    "phone": "phone_normalized",
+    "tag": "telegram_tag_normalized",
+    "email": "email_normalized",
+    "whatsapp": "whatsapp_normalized",
+}
+
+
+def _account_atoms(account):
+    """Значения колонок аккаунта, по которым его находит поиск: записи кэша с ними устаревают при правке"""
+    return {(kind, getattr(account, column)) for kind, column in IDENTIFIER_COLUMNS.items()
+            if getattr(account, column) is not None}
+
+
+class LookupCache:
+    """LRU-кэш результатов поиска по идентификатору со сроком жизни ttl секунд.
+
+    Каждая запись помнит значения колонок, по которым шел поиск (_identifier_atoms),
+    поэтому правка аккаунта сбрасывает только записи, где он был или мог оказаться.
+    Одинаковые запросы, пришедшие одновременно, ждут один запрос к базе. Ошибки
+    не кэшируются. Результаты общие для всех вызывающих, менять их нельзя.
+
+    on_change, если задан, вызывается после invalidate — так о правке узнают
+    кэши в других процессах.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (время истечения, результат, atoms), от старых обращений к новым
+        self._entries = OrderedDict()
+        # atom -> ключи записей, зависящих от него
+        self._by_atom = {}
+        # key -> задача запроса к базе, которую ждут все одинаковые запросы
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.on_change = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key, atoms, loader):
+        """Результат для key из кэша или от loader() — корутины запроса к базе"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._drop(key)
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._pending[key] = asyncio.ensure_future(loader())
+            task.add_done_callback(lambda done: self._store(key, atoms, done))
+        else:
+            self.hits += 1
+        # shield: отмена одного ожидающего не отменяет запрос остальным
+        return await asyncio.shield(task)
+
+    def _store(self, key, atoms, task):
+        # Если ключ сбросили, пока шел запрос, результат мог устареть — не сохраняем
+        if self._pending.get(key) is not task:
+            return
+        del self._pending[key]
+        if task.cancelled() or task.exception() is not None or not self.maxsize or not self.ttl:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, task.result(), atoms)
+        for atom in atoms:
+            self._by_atom.setdefault(atom, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, _, atoms = self._entries.pop(key)
+        for atom in atoms:
+            keys = self._by_atom.get(atom)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_atom[atom]
+
+    def invalidate(self, atoms):
+        """Сбросить записи и идущие запросы, зависящие от любого из atoms"""
+        for atom in atoms:
+            for key in self._by_atom.pop(atom, set()) & self._entries.keys():
+                self._drop(key)
+        for key in [key for key in self._pending if _identifier_atoms(*key) & atoms]:
+            del self._pending[key]
+        if self.on_change:
+            self.on_change()
+
+    def clear(self):
+        self._entries.clear()
+        self._by_atom.clear()
+        self._pending.clear()
+
+
+def _add_normalized_columns(conn):
+    for target, _ in NORMALIZED_COLUMNS.values():
+        add_column(conn, Account.__table__.c[target])
+
+
+def _backfill_normalized(conn, batch_size=5000):
+    """Заполнить нормализованные колонки (NORMALIZED_COLUMNS) старых строк, по транзакции на пачку"""
+    # Курсор по id: строки, которые нормализуются в NULL, не должны выбираться повторно
+    accounts = Account.__table__
+    pending = or_(*(
+        (accounts.c[target].is_(None) & accounts.c[source].is_not(None))
+        for source, (target, _) in NORMALIZED_COLUMNS.items()
+    ))
+    sources = [accounts.c[source] for source in NORMALIZED_COLUMNS]
+    last_id, filled = 0, 0
+    while True:
+        rows = conn.execute(
+            select(accounts.c.id, *sources)
+            .where(accounts.c.id > last_id, pending)
+            .order_by(accounts.c.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        conn.execute(
+            update(accounts)
+            .where(accounts.c.id == bindparam('account_id'))
+            .values({target: bindparam(target) for target, _ in NORMALIZED_COLUMNS.values()}),
+            [
+                {"account_id": row["id"],
+                 **{target: normalize(row[source]) for source, (target, normalize) in NORMALIZED_COLUMNS.items()}}
+                for row in rows
+            ]
+        )
+        # Блокировка записи держится только на время пачки
+        conn.commit()
+        last_id = rows[-1]["id"]
+        filled += len(rows)
+    if filled:
+        logger.info(f"Заполнены нормализованные идентификаторы для {filled} аккаунтов")
+
+
+def _create_indexes(*names):
+    indexes = {index.name: index for index in Account.__table__.indexes}
+
+    def apply(conn):
+        for name in names:
+            create_index(conn, indexes[name])
+    return apply
+
+
+def _add_whatsapp_normalized(conn):
+    add_column(conn, Account.__table__.c.whatsapp_normalized)
+    # Заполняются только пустые нормализованные колонки: на уже мигрированной базе это новая
+    _backfill_normalized(conn)
+    _create_indexes("ix_accounts_whatsapp_normalized")(conn)
+
+
+# Миграции accounts.db (db/migrations.py); новые добавляются в конец со следующей версией
+MIGRATIONS = [
+    Migration(1, "нормализованные колонки идентификаторов", _add_normalized_columns),
+    Migration(2, "заполнение нормализованных колонок", _backfill_normalized),
+    Migration(3, "индексы поиска по идентификаторам", _create_indexes(
+        "ix_accounts_telegram_id", "ix_accounts_telegram_tag_normalized", "ix_accounts_phone_normalized",
+        "ix_accounts_whatsapp_id", "ix_accounts_email_normalized")),
+    Migration(4, "индекс accounts.person_id", _create_indexes("ix_accounts_person_id")),
+    Migration(5, "нормализованный WhatsApp ID", _add_whatsapp_normalized),
+]
+
+
+class AsyncDatabase:
+    """Асинхронный доступ к базе людей и аккаунтов (aiosqlite), используется хендлерами бота"""
 
-class Database:
     def __init__(self, db_name='accounts.db'):
-        # Абсолютный путь к базе в папке data/
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        db_path = os.path.join(base_dir, 'data', db_name)
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.db_path = db_path
-        # Используем синхронный create_engine вместо create_async_engine
-        self.engine = create_engine(f'sqlite:///{self.db_path}', echo=False)
-        # Создаем таблицы
-        Base.metadata.create_all(self.engine)
-        # Создаем синхронную сессию
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # Движок создается в connect(): импорт модуля не трогает диск
+        self.db_name = db_name
+        self.db_path = None
+        self.engine = None
+        self.session_factory = None
+        self.lookup_cache = LookupCache()
+
+    def connect(self):
+        """Создать движок (один раз); путь к базе берется из DATA_DIR на момент вызова"""
+        if self.engine is not None:
+            return
+        self.db_path = data_path(self.db_name)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.engine = create_async_engine(f'sqlite+aiosqlite:///{self.db_path}', echo=False)
+        # WAL, synchronous, кэш и т.д. для каждого соединения (db/sqlite.py)
+        apply_profile(self.engine, profile_from_env())
+        # expire_on_commit=False: объекты остаются доступны после commit без ленивой подгрузки
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def create_tables(self):
+        """Создать таблицы, если их ещё нет, и применить миграции схемы (MIGRATIONS)"""
+        self.connect()
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(self.engine, MIGRATIONS)
         logger.info(f"База данных подключена: {self.db_path}")
 
-    def add_person(self, last_name, first_name, middle_name=None, description=None):
+    async def add_person(self, last_name, first_name, middle_name=None, description=None):
         try:
-            person = Person(last_name=last_name, first_name=first_name, middle_name=middle_name,
-                            description=description)
-            self.session.add(person)
-            self.session.commit()
+            async with self.session_factory() as session:
+                person = Person(last_name=last_name, first_name=first_name, middle_name=middle_name,
+                                description=description)
+                session.add(person)
+                await session.commit()
             logger.info(f"Добавлен человек: {last_name} {first_name}")
             return person.id
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при добавлении человека: {e}")
             return None
 
-    def add_account(self, person_id, messenger_type, telegram_id=None, telegram_tag=None,
-                    phone_number=None, whatsapp_id=None, email=None):
+    async def add_account(self, person_id, messenger_type, telegram_id=None, telegram_tag=None,
+                          phone_number=None, whatsapp_id=None, email=None):
         try:
-            person = self.session.query(Person).filter_by(id=person_id).first()
-            if not person:
-                logger.error(f"Человек с ID {person_id} не найден")
-                return False
-            account = Account(
-                messenger_type=messenger_type,
-                telegram_id=telegram_id,
-                telegram_tag=telegram_tag,
-                phone_number=phone_number,
-                whatsapp_id=whatsapp_id,
-                email=email,
-                person_id=person_id
-            )
-            self.session.add(account)
-            self.session.commit()
+            async with self.session_factory() as session:
+                person = await session.get(Person, person_id)
+                if not person:
+                    logger.error(f"Человек с ID {person_id} не найден")
+                    return False
+                account = Account(
+                    messenger_type=messenger_type,
+                    telegram_id=telegram_id,
+                    telegram_tag=telegram_tag,
+                    phone_number=phone_number,
+                    whatsapp_id=whatsapp_id,
+                    email=email,
+                    person_id=person_id
+                )
+                session.add(account)
+                await session.commit()
+            self.lookup_cache.invalidate(_account_atoms(account))
             logger.info(f"Добавлен аккаунт: {messenger_type} для person_id={person_id}")
             return True
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при добавлении аккаунта: {e}")
             return False
 
-    def find_by_phone_number(self, phone_number):
+    async def _lookup(self, condition):
+        """Аккаунты по условию на индексированные колонки и их владельцы — одним JOIN-запросом"""
+        async with self.session_factory() as session:
+            rows = (await session.execute(
+                select(Account, Person)
+                .join(Person, Account.person_id == Person.id)
+                .where(condition)
+            )).all()
+        result = {"accounts": [], "persons": []}
+        seen_persons = set()
+        for account, person in rows:
+            result["accounts"].append(_account_to_dict(account))
+            if person.id not in seen_persons:
+                seen_persons.add(person.id)
+                result["persons"].append(_person_to_dict(person))
+        return result
+
+    async def _cached_lookup(self, kind, normalized):
+        return await self.lookup_cache.get(
+            (kind, normalized), _identifier_atoms(kind, normalized),
+            lambda: self._lookup(_identifier_condition(kind, normalized)))
+
+    async def find_by_phone_number(self, phone_number):
+        """Найти аккаунты и людей по номеру в любой записи (+7 999…, 8999…, 7999…)"""
+        normalized = normalize_phone(phone_number)
+        if not normalized:
+            return {"accounts": [], "persons": []}
         try:
-            accounts = self.session.query(Account).filter_by(phone_number=phone_number).all()
-            result = {"accounts": [], "persons": []}
-            for account in accounts:
-                person = self.session.query(Person).filter_by(id=account.person_id).first()
-                result["accounts"].append({
-                    "messenger_type": account.messenger_type,
-                    "telegram_id": account.telegram_id,
-                    "telegram_tag": account.telegram_tag,
-                    "phone_number": account.phone_number,
-                    "whatsapp_id": account.whatsapp_id,
-                    "email": account.email,
-                    "person_id": account.person_id
-                })
-                result["persons"].append({
-                    "id": person.id,
-                    "last_name": person.last_name,
-                    "first_name": person.first_name,
-                    "middle_name": person.middle_name,
-                    "description": person.description
-                })
-            logger.info(f"Найдено {len(accounts)} аккаунтов для номера {phone_number}")
+            result = await self._cached_lookup("phone", normalized)
+            logger.debug(f"Найдено {len(result['accounts'])} аккаунтов для номера {normalized}")
             return result
         except Exception as e:
             logger.error(f"Ошибка при поиске по номеру телефона {phone_number}: {e}")
             return {"accounts": [], "persons": []}
 
-    def delete_person(self, person_id):
+    async def find_by_identifier(self, value):
+        """Найти по Telegram ID, @тегу, email, WhatsApp ID или телефону, тип определяется автоматически.
+
+        В результате дополнительно возвращается kind — распознанный тип (None, если не распознан).
+        """
+        kind, normalized = detect_identifier(value)
+        if kind is None:
+            return {"kind": None, "accounts": [], "persons": []}
         try:
-            person = self.session.query(Person).filter_by(id=person_id).first()
-            if not person:
-                logger.error(f"Человек с ID {person_id} не найден")
-                return False
-            self.session.delete(person)
-            self.session.commit()
+            result = await self._cached_lookup(kind, normalized)
+            logger.debug(f"Найдено {len(result['accounts'])} аккаунтов по {kind}={normalized}")
+            return {"kind": kind, **result}
+        except Exception as e:
+            logger.error(f"Ошибка при поиске по идентификатору {value}: {e}")
+            return {"kind": kind, "accounts": [], "persons": []}
+
+    async def lookup_many(self, values):
+        """Поиск сразу по многим идентификаторам (как в find_by_identifier) запросами IN по IN_CHUNK_SIZE значений.
+
+        Асинхронно отдает (value, kind, account, person) со словарями как в find_by_identifier:
+        по строке на каждый найденный аккаунт, затем по строке с account=None и person=None для каждого значения без
+        результатов (kind=None, если идентификатор не распознан).
+        """
+        # (тип, значение колонки) -> исходные значения, которые его ищут
+        wanted = {}
+        recognized = {}
+        # Только цифры ищутся и как Telegram ID, и как телефон: один аккаунт может найтись дважды
+        ambiguous, ambiguous_found = set(), set()
+        for value in dict.fromkeys(values):
+            kind, normalized = detect_identifier(value)
+            if kind is None:
+                continue
+            recognized[value] = kind
+            atoms = _identifier_atoms(kind, normalized)
+            for atom in atoms:
+                wanted.setdefault(atom, []).append(value)
+            if len(atoms) > 1:
+                ambiguous.add(value)
+
+        by_kind = {}
+        for kind, column_value in wanted:
+            by_kind.setdefault(kind, []).append(column_value)
+        found = set()
+        async with self.session_factory() as session:
+            for kind, column_values in by_kind.items():
+                column = IDENTIFIER_COLUMNS[kind]
+                for chunk in chunks(column_values):
+                    rows = (await session.execute(
+                        select(Account, Person).join(Person, Account.person_id == Person.id)
+                        .where(getattr(Account, column).in_(chunk))
+                        .order_by(Account.id)
+                    )).all()
+                    # Объекты не копятся в сессии от пачки к пачке
+                    session.expunge_all()
+                    for account, person in rows:
+                        for value in wanted[(kind, getattr(account, column))]:
+                            if value in ambiguous:
+                                if (value, account.id) in ambiguous_found:
+                                    continue
+                                ambiguous_found.add((value, account.id))
+                            found.add(value)
+                            yield value, recognized[value], _account_to_dict(account), _person_to_dict(person)
+        for value in dict.fromkeys(values):
+            if value not in found:
+                yield value, recognized.get(value), None, None
+
+    async def _linked_hop(self, session, frontier, limit, follow=True):
+        """Аккаунты людей frontier и (если follow) все аккаунты с общими с ними идентификаторами — одним запросом"""
+        own = Account.person_id.in_(frontier)
+        condition = own
+        if follow:
+            condition = or_(own, *(
+                getattr(Account, column).in_(select(getattr(Account, column)).where(own))
+                for column in IDENTIFIER_COLUMNS.values()
+            ))
+        return (await session.scalars(select(Account).where(condition).order_by(Account.id).limit(limit))).all()
+
+    async def find_linked(self, value, max_depth=2, max_persons=50, max_accounts=300):
+        """Связанные люди: владельцы идентификатора value и все, с кем они делят любой идентификатор.
+
+        Обход в ширину: на каждом шаге один запрос добавляет людей, у которых есть
+        общий телефон, тег, email, Telegram ID или WhatsApp ID с уже найденными.
+        Не больше max_depth шагов, max_persons людей и max_accounts аккаунтов;
+        truncated=True, если лимит обрезал результат. У людей в результате depth —
+        номер шага, на котором человек найден.
+        """
+        kind, normalized = detect_identifier(value)
+        result = {"kind": kind, "accounts": [], "persons": [], "truncated": False}
+        if kind is None:
+            return result
+        try:
+            async with self.session_factory() as session:
+                seed = (await session.scalars(
+                    select(Account.person_id).where(_identifier_condition(kind, normalized))
+                    .distinct().order_by(Account.person_id).limit(max_persons + 1)
+                )).all()
+                if len(seed) > max_persons:
+                    seed, result["truncated"] = seed[:max_persons], True
+                depth = {person_id: 0 for person_id in seed}
+                accounts = {}
+                frontier = seed
+                for step in range(1, max_depth + 2):
+                    if not frontier:
+                        break
+                    # Последний шаг только дочитывает аккаунты людей, найденных на предыдущем
+                    follow = step <= max_depth
+                    limit = max_accounts + 1 - len(accounts)
+                    rows = await self._linked_hop(session, frontier, limit, follow)
+                    if len(rows) == limit:
+                        result["truncated"] = True
+                    new = sorted({account.person_id for account in rows} - depth.keys()) if follow else []
+                    if len(depth) + len(new) > max_persons:
+                        new, result["truncated"] = new[:max_persons - len(depth)], True
+                    depth.update((person_id, step) for person_id in new)
+                    for account in rows:
+                        if account.person_id in depth and len(accounts) < max_accounts:
+                            accounts[account.id] = account
+                    frontier = new
+                persons = (await session.scalars(select(Person).where(Person.id.in_(list(depth))))).all()
+        except Exception as e:
+            logger.error(f"Ошибка при поиске связей {value}: {e}")
+            return result
+        result["accounts"] = [_account_to_dict(account) for account in sorted(accounts.values(), key=lambda a: a.id)]
+        result["persons"] = sorted(({**_person_to_dict(person), "depth": depth[person.id]} for person in persons),
+                                   key=lambda person: (person["depth"], person["id"]))
+        logger.debug(f"Связи {kind}={normalized}: {len(result['persons'])} людей, {len(result['accounts'])} аккаунтов")
+        return result
+
+    async def delete_person(self, person_id):
+        try:
+            async with self.session_factory() as session:
+                # Аккаунты подгружаем сразу: каскадное удаление не может лениво загружать их в async-сессии
+                person = await session.get(Person, person_id, options=[selectinload(Person.accounts)])
+                if not person:
+                    logger.error(f"Человек с ID {person_id} не найден")
+                    return False
+                atoms = set().union(*(_account_atoms(account) for account in person.accounts))
+                await session.delete(person)
+                await session.commit()
+            self.lookup_cache.invalidate(atoms)
             logger.info(f"Удален человек: {person_id}")
             return True
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при удалении человека: {e}")
             return False
 
-    def delete_account(self, account_id):
+    async def delete_account(self, account_id):
         try:
-            account = self.session.query(Account).filter_by(id=account_id).first()
-            if not account:
-                logger.error(f"Аккаунт с ID {account_id} не найден")
-                return False
-            self.session.delete(account)
-            self.session.commit()
+            async with self.session_factory() as session:
+                account = await session.get(Account, account_id)
+                if not account:
+                    logger.error(f"Аккаунт с ID {account_id} не найден")
+                    return False
+                await session.delete(account)
+                await session.commit()
+            self.lookup_cache.invalidate(_account_atoms(account))
             logger.info(f"Удален аккаунт: {account_id}")
             return True
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Ошибка при удалении аккаунта: {e}")
             return False
 
-    def get_all_persons(self):
+    async def _get_page(self, model, cursor, limit, backward):
+        """Keyset-пагинация: WHERE id > cursor LIMIT n (или id < cursor для движения назад).
+
+        Читается только limit + 1 строк по первичному ключу, поэтому стоимость
+        страницы не зависит от размера таблицы.
+        """
+        async with self.session_factory() as session:
+            if backward:
+                query = select(model).where(model.id < cursor).order_by(model.id.desc())
+            else:
+                query = select(model).where(model.id > cursor).order_by(model.id)
+            rows = (await session.scalars(query.limit(limit + 1))).all()
+            has_more = len(rows) > limit
+            items = rows[:limit]
+            if backward:
+                items.reverse()
+            if not items:
+                return Page(items=[], has_prev=False, has_next=False)
+            # Есть ли строки с другой стороны страницы — одна выборка по индексу
+            if backward:
+                other = select(model.id).where(model.id > items[-1].id).limit(1)
+            else:
+                other = select(model.id).where(model.id < items[0].id).limit(1)
+            has_other = await session.scalar(other) is not None
+        if backward:
+            return Page(items=items, has_prev=has_more, has_next=has_other)
+        return Page(items=items, has_prev=has_other, has_next=has_more)
+
+    async def get_persons_page(self, cursor=0, limit=20, backward=False):
+        """Страница людей после (или до, если backward) id=cursor"""
+        try:
+            return await self._get_page(Person, cursor, limit, backward)
+        except Exception as e:
+            logger.error(f"Ошибка при получении страницы людей: {e}")
+            return Page(items=[], has_prev=False, has_next=False)
+
+    async def get_accounts_page(self, cursor=0, limit=20, backward=False):
+        """Страница аккаунтов после (или до, если backward) id=cursor"""
+        try:
+            return await self._get_page(Account, cursor, limit, backward)
+        except Exception as e:
+            logger.error(f"Ошибка при получении страницы аккаунтов: {e}")
+            return Page(items=[], has_prev=False, has_next=False)
+
+    async def get_all_persons(self):
         try:
-            return self.session.query(Person).all()
+            async with self.session_factory() as session:
+                return (await session.scalars(select(Person))).all()
         except Exception as e:
             logger.error(f"Ошибка при получении списка людей: {e}")
             return []
 
-    def get_all_accounts(self):
+    async def get_all_accounts(self):
         try:
-            return self.session.query(Account).all()
+            async with self.session_factory() as session:
+                return (await session.scalars(select(Account))).all()
         except Exception as e:
             logger.error(f"Ошибка при получении списка аккаунтов: {e}")
             return []
 
+    async def bulk_insert_persons(self, rows):
+        """Вставить пачку людей одной транзакцией (executemany).
+
+        Возвращает отклоненные строки (row, причина): id уже занят или повторяется в пачке.
+        """
+        async with self.engine.begin() as conn:
+            taken = await existing_values(conn, Person.id, {row.get("id") for row in rows} - {None})
+            valid, rejected = split_conflicts(rows, "id", taken)
+            if valid:
+                await conn.execute(sqlite_insert(Person.__table__), valid)
+        return rejected
+
+    async def bulk_insert_accounts(self, rows):
+        """Вставить пачку аккаунтов одной транзакцией (executemany).
+
+        Существование person_id и занятость id проверяются запросами на всю пачку;
+        возвращает отклоненные строки (row, причина).
+        """
+        async with self.engine.begin() as conn:
+            persons = await existing_values(conn, Person.id, {row["person_id"] for row in rows})
+            rejected = [(row, f"человек с ID {row['person_id']} не найден")
+                        for row in rows if row["person_id"] not in persons]
+            rows = [row for row in rows if row["person_id"] in persons]
+            taken = await existing_values(conn, Account.id, {row.get("id") for row in rows} - {None})
+            valid, conflicts = split_conflicts(rows, "id", taken)
+            if valid:
+                await conn.execute(sqlite_insert(Account.__table__), valid)
+        return rejected + conflicts
+
+    async def iter_rows(self, table_name, batch_size=1000):
+        """Потоково отдавать строки таблицы persons/accounts как dict, читая по batch_size"""
+        table = Base.metadata.tables[table_name]
+        async with self.engine.connect() as conn:
+            result = await conn.stream(select(table).order_by(table.c.id).execution_options(yield_per=batch_size))
+            # Пачками: один переход в поток драйвера на batch_size строк, а не на каждую
+            async for partition in result.mappings().partitions():
+                for row in partition:
+                    yield row
+
+    async def iter_shared_identifiers(self):
+        """Пары ((тип, значение), person_id) для идентификаторов, которые есть у нескольких людей.
+
+        По одному запросу на колонку IDENTIFIER_COLUMNS: GROUP BY идет по индексу
+        колонки, в Python попадают только общие значения, а не все аккаунты.
+        Пары отсортированы по идентификатору.
+        """
+        accounts = Account.__table__
+        async with self.engine.connect() as conn:
+            for kind, column_name in IDENTIFIER_COLUMNS.items():
+                column = accounts.c[column_name]
+                shared = (
+                    select(column)
+                    .where(column.is_not(None))
+                    .group_by(column)
+                    .having(func.count(accounts.c.person_id.distinct()) > 1)
+                )
+                rows = await conn.execute(
+                    select(column, accounts.c.person_id)
+                    .where(column.in_(shared))
+                    .distinct()
+                    .order_by(column, accounts.c.person_id)
+                )
+                for value, person_id in rows:
+                    yield (kind, value), person_id
+
+    async def find_duplicate_clusters(self):
+        """Кластеры людей, связанных общими идентификаторами (db/dedup.py)"""
+        pairs = [pair async for pair in self.iter_shared_identifiers()]
+        return build_clusters(pairs)
+
+    async def get_persons(self, person_ids):
+        """Люди по списку id: {id: Person}"""
+        async with self.session_factory() as session:
+            persons = (await session.scalars(select(Person).where(Person.id.in_(person_ids)))).all()
+        return {person.id: person for person in persons}
+
+    async def merge_persons(self, target_id, person_ids):
+        """Перенести аккаунты людей person_ids к target_id и удалить их — одной транзакцией.
+
+        Возвращает число перенесенных аккаунтов или None, если кого-то из людей нет.
+        """
+        others = set(person_ids) - {target_id}
+        try:
+            async with self.session_factory() as session, session.begin():
+                found = set((await session.scalars(
+                    select(Person.id).where(Person.id.in_(others | {target_id}))
+                )).all())
+                missing = (others | {target_id}) - found
+                if missing:
+                    logger.error(f"Люди не найдены: {', '.join(map(str, sorted(missing)))}")
+                    return None
+                accounts = (await session.scalars(
+                    select(Account).where(Account.person_id.in_(others | {target_id}))
+                )).all()
+                moved = (await session.execute(
+                    update(Account).where(Account.person_id.in_(others)).values(person_id=target_id)
+                )).rowcount
+                await session.execute(delete(Person).where(Person.id.in_(others)))
+            # В найденных результатах владелец аккаунтов сменился
+            self.lookup_cache.invalidate(set().union(*(_account_atoms(account) for account in accounts)))
+            logger.info(f"Объединены люди {', '.join(map(str, sorted(others)))} в {target_id}: "
+                        f"перенесено аккаунтов {moved}")
+            return moved
+        except Exception as e:
+            logger.error(f"Ошибка при объединении людей: {e}")
+            return None
+
+    async def close(self):
+        """Закрыть соединения с базой данных; следующий запрос откроет их заново"""
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+class Database:
+    """Синхронная обёртка над AsyncDatabase для скриптов"""
+
+    def __init__(self, db_name='accounts.db'):
+        self._loop = asyncio.new_event_loop()
+        self._db = AsyncDatabase(db_name)
+        self._run(self._db.create_tables())
+        self.db_path = self._db.db_path
+
+    def _run(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    def add_person(self, last_name, first_name, middle_name=None, description=None):
+        return self._run(self._db.add_person(last_name, first_name, middle_name, description))
+
+    def add_account(self, person_id, messenger_type, telegram_id=None, telegram_tag=None,
+                    phone_number=None, whatsapp_id=None, email=None):
+        return self._run(self._db.add_account(person_id, messenger_type, telegram_id, telegram_tag,
+                                              phone_number, whatsapp_id, email))
+
+    def find_by_phone_number(self, phone_number):
+        return self._run(self._db.find_by_phone_number(phone_number))
+
+    def find_by_identifier(self, value):
+        return self._run(self._db.find_by_identifier(value))
+
+    def delete_person(self, person_id):
+        return self._run(self._db.delete_person(person_id))
+
+    def delete_account(self, account_id):
+        return self._run(self._db.delete_account(account_id))
+
+    def get_persons_page(self, cursor=0, limit=20, backward=False):
+        return self._run(self._db.get_persons_page(cursor, limit, backward))
+
+    def get_accounts_page(self, cursor=0, limit=20, backward=False):
+        return self._run(self._db.get_accounts_page(cursor, limit, backward))
+
+    def get_all_persons(self):
+        return self._run(self._db.get_all_persons())
+
+    def get_all_accounts(self):
+        return self._run(self._db.get_all_accounts())
+
     def close(self):
         """Закрыть соединение с базой данных"""
-        self.session.close()
+        self._run(self._db.close())
+        self._loop.close()
 
 
-# Создаем экземпляр базы данных
-new_db_instance = Database()
+# Создаем экземпляр базы данных (таблицы создаются при старте бота через create_tables)
+new_db_instance = AsyncDatabase()
@@ -0,0 +1,72 @@
+"""Поиск людей-дубликатов: persons, связанные общим идентификатором в accounts.
+
+Пары (идентификатор, человек) для значений, встречающихся у нескольких людей,
+отбирает база (AsyncDatabase.iter_shared_identifiers), здесь они объединяются в
+кластеры системой непересекающихся множеств — без попарного сравнения людей.
+"""
+from typing import NamedTuple
+
+
+class UnionFind:
+    """Система непересекающихся множеств со сжатием путей и объединением по размеру"""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent == item:
+            return item
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size.get(a, 1) < self.size.get(b, 1):
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] = self.size.get(a, 1) + self.size.pop(b, 1)
+        return a
+
+
+class DuplicateCluster(NamedTuple):
+    """Люди, связанные общими идентификаторами напрямую или через цепочку"""
+    person_ids: list
+    # (тип, значение) идентификаторов, которые есть у нескольких людей кластера
+    identifiers: list
+
+
+def build_clusters(shared_identifiers):
+    """Кластеры из пар ((тип, значение), person_id), отсортированных по идентификатору.
+
+    Самые большие кластеры — первыми.
+    """
+    groups = UnionFind()
+    # (идентификатор, первый из его владельцев): кластер определяется после всех объединений
+    identifiers = []
+    current, first = None, None
+    for identifier, person_id in shared_identifiers:
+        if identifier != current:
+            current, first = identifier, person_id
+            identifiers.append((identifier, person_id))
+        elif person_id != first:
+            groups.union(first, person_id)
+
+    members = {}
+    for person_id in groups.parent:
+        members.setdefault(groups.find(person_id), []).append(person_id)
+    shared = {}
+    for identifier, person_id in identifiers:
+        root = groups.find(person_id)
+        if root in members:
+            shared.setdefault(root, []).append(identifier)
+    clusters = [DuplicateCluster(sorted(ids), shared.get(root, [])) for root, ids in members.items()]
+    clusters.sort(key=lambda cluster: (-len(cluster.person_ids), cluster.person_ids[0]))
+    return clusters
@@ -0,0 +1,86 @@
+"""Версионные миграции схемы SQLite.
+
+В каждой базе таблица schema_version хранит примененные миграции. При старте
+(create_tables) и из app/migrate.py применяются по порядку миграции с версией
+больше текущей; если схема актуальна, выполняется только чтение версии.
+
+Миграция может фиксировать работу частями (conn.commit()): каждый индекс строится
+в своей транзакции, заполнение колонок идет пачками, поэтому блокировка записи не
+держится на всё время миграции. Версия записывается последней транзакцией, так что
+миграция, прерванная посередине, при следующем запуске выполнится заново — шаги
+миграций должны быть идемпотентными (add_column и create_index такими и являются).
+"""
+import time
+from typing import Callable, NamedTuple
+
+from loguru import logger
+from sqlalchemy import inspect
+
+VERSION_TABLE = "schema_version"
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    # apply(conn): синхронное соединение SQLAlchemy
+    apply: Callable
+
+
+def add_column(conn, column):
+    """ALTER TABLE … ADD COLUMN для колонки модели, если ее еще нет"""
+    table = column.table
+    if column.name in {existing['name'] for existing in inspect(conn).get_columns(table.name)}:
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+    conn.commit()
+    logger.info(f"Добавлена колонка {table.name}.{column.name}")
+
+
+def create_index(conn, index):
+    """Построить индекс модели, если его еще нет, отдельной транзакцией"""
+    started = time.monotonic()
+    index.create(conn, checkfirst=True)
+    conn.commit()
+    logger.debug(f"Индекс {index.name} готов за {time.monotonic() - started:.1f} с")
+
+
+def _current_version(conn):
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    )
+    version = conn.exec_driver_sql(f"SELECT MAX(version) FROM {VERSION_TABLE}").scalar() or 0
+    conn.commit()
+    return version
+
+
+def migrate(conn, migrations):
+    """Применить миграции новее текущей версии; возвращает (было, стало)"""
+    current = _current_version(conn)
+    version = current
+    for migration in sorted(migrations, key=lambda item: item.version):
+        if migration.version <= version:
+            continue
+        started = time.monotonic()
+        migration.apply(conn)
+        conn.exec_driver_sql(
+            f"INSERT INTO {VERSION_TABLE} (version, description, applied_at) VALUES (?, ?, datetime('now'))",
+            (migration.version, migration.description),
+        )
+        conn.commit()
+        version = migration.version
+        logger.info(f"Миграция {version} ({migration.description}) применена за {time.monotonic() - started:.1f} с")
+    return current, version
+
+
+async def run_migrations(engine, migrations):
+    """Применить миграции к базе движка (async); (было, стало)"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(migrate, migrations)
+
+
+async def schema_version(engine):
+    """Текущая версия схемы базы"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(_current_version)
@@ -0,0 +1,90 @@
+import re
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(phone):
+    """Привести номер телефона к каноническому виду E.164 (+79991234567).
+
+    Разные записи одного номера (+7 999…, 8999…, 7999…) дают одно значение.
+    Возвращает None, если в строке нет цифр.
+    """
+    if not phone:
+        return None
+    digits = _NON_DIGITS.sub('', str(phone))
+    if digits.startswith('00'):  # международный префикс 00 вместо +
+        digits = digits[2:]
+    if not digits:
+        return None
+    if len(digits) == 11 and digits[0] == '8':  # российский формат 8XXXXXXXXXX
+        digits = '7' + digits[1:]
+    elif len(digits) == 10 and digits[0] == '9':  # мобильный номер без кода страны
+        digits = '7' + digits
+    return '+' + digits
+
+
+_TAG_PREFIXES = ('https://t.me/', 'http://t.me/', 't.me/', '@')
+_TAG_RE = re.compile(r'^[a-z][a-z0-9_]{3,31}$')
+_WHATSAPP_SUFFIXES = ('@c.us', '@s.whatsapp.net', '@g.us')
+
+
+def normalize_tag(tag):
+    """Telegram-тег без @ и ссылки t.me/, в нижнем регистре (теги регистронезависимы)"""
+    if not tag:
+        return None
+    tag = str(tag).strip().casefold()
+    for prefix in _TAG_PREFIXES:
+        if tag.startswith(prefix):
+            tag = tag[len(prefix):]
+    return tag or None
+
+
+def normalize_email(email):
+    """Email без пробелов по краям, в нижнем регистре"""
+    if not email:
+        return None
+    return str(email).strip().casefold() or None
+
+
+def normalize_whatsapp(whatsapp_id):
+    """WhatsApp ID без суффикса (@c.us, @s.whatsapp.net, @g.us) и +, в нижнем регистре.
+
+    79991234567@c.us, +79991234567 и 79991234567 дают одно значение.
+    """
+    if not whatsapp_id:
+        return None
+    value = str(whatsapp_id).strip().casefold()
+    for suffix in _WHATSAPP_SUFFIXES:
+        if value.endswith(suffix):
+            value = value[:-len(suffix)]
+            break
+    return value.lstrip('+') or None
+
+
+def detect_identifier(value):
+    """Определить тип идентификатора и привести его к виду, в котором он хранится в индексе.
+
+    Возвращает (kind, normalized), kind: phone, tag, email, whatsapp или number —
+    только цифры, это может быть и Telegram ID, и телефон. (None, None), если строка
+    не похожа ни на один идентификатор.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None, None
+    lowered = value.casefold()
+    if lowered.endswith(_WHATSAPP_SUFFIXES):
+        whatsapp_id = normalize_whatsapp(value)
+        return ('whatsapp', whatsapp_id) if whatsapp_id else (None, None)
+    if value.startswith('@') or 't.me/' in lowered:
+        tag = normalize_tag(value)
+        return ('tag', tag) if tag else (None, None)
+    if '@' in value:
+        return 'email', normalize_email(value)
+    if value.isdigit():
+        return 'number', value
+    if value.startswith('+') or set(value) <= set('0123456789 -()'):
+        phone = normalize_phone(value)
+        return ('phone', phone) if phone else (None, None)
+    if _TAG_RE.match(lowered):
+        return 'tag', lowered
+    return None, None
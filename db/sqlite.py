@@ -0,0 +1,116 @@
+"""Профиль хранения SQLite: PRAGMA для каждого нового соединения и периодическое обслуживание.
+
+Значения по умолчанию рассчитаны на бота: WAL (читатели не ждут писателя),
+synchronous=NORMAL (в WAL без fsync на каждый commit, база не портится при сбое
+питания, теряются только последние транзакции), кэш страниц и mmap побольше.
+Любой параметр переопределяется переменной окружения SQLITE_<ИМЯ>, например
+SQLITE_SYNCHRONOUS=FULL.
+"""
+import asyncio
+import os
+from typing import NamedTuple
+
+from loguru import logger
+from sqlalchemy import event, select
+
+
+# Размер списка в одном IN (…): с запасом ниже лимита переменных SQLite
+IN_CHUNK_SIZE = 500
+# Наибольшее значение INTEGER в SQLite (int64): большее число драйвер не передаст в запрос
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def chunks(items, size=IN_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def existing_values(conn, column, values):
+    """Какие из values уже есть в колонке (запросами IN по IN_CHUNK_SIZE)"""
+    values = list(values)
+    found = set()
+    for chunk in chunks(values):
+        found.update((await conn.scalars(select(column).where(column.in_(chunk)))).all())
+    return found
+
+
+def split_conflicts(rows, key, existing):
+    """Разделить пачку на строки для вставки и отклоненные (row, причина).
+
+    Отклоняются строки, у которых значение key уже есть в базе (existing) или
+    встретилось раньше в этой же пачке. Строки без значения key (id назначит база)
+    идут в конец, чтобы автоматически выданный id не занял id из следующих строк.
+    """
+    fresh, generated, rejected = [], [], []
+    seen = set()
+    for row in rows:
+        value = row.get(key)
+        if value is None:
+            generated.append(row)
+        elif value in existing:
+            rejected.append((row, f"{key}={value} уже есть в базе"))
+        elif value in seen:
+            rejected.append((row, f"{key}={value} повторяется в файле"))
+        else:
+            seen.add(value)
+            fresh.append(row)
+    return fresh + generated, rejected
+
+
+def data_path(db_name: str) -> str:
+    """Путь к файлу базы в папке data/ проекта (каталог переопределяется переменной DATA_DIR)"""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(os.environ.get('DATA_DIR') or os.path.join(base_dir, 'data'), db_name)
+
+
+class SqliteProfile(NamedTuple):
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    # Отрицательное значение — размер в КиБ на соединение
+    cache_size: int = -16000
+    mmap_size: int = 128 * 1024 * 1024
+    busy_timeout: int = 5000
+    temp_store: str = "MEMORY"
+
+
+def profile_from_env() -> SqliteProfile:
+    """Профиль по умолчанию с поправками из переменных SQLITE_*"""
+    values = {}
+    for field, default in SqliteProfile._field_defaults.items():
+        value = os.environ.get(f"SQLITE_{field.upper()}")
+        if value is not None:
+            values[field] = type(default)(value)
+    return SqliteProfile(**values)
+
+
+def apply_profile(engine, profile: SqliteProfile):
+    """Выполнять PRAGMA профиля при открытии каждого соединения движка (sync или async)"""
+    pragmas = [f"PRAGMA {name}={value}" for name, value in profile._asdict().items()]
+
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+async def run_maintenance(engine):
+    """Обновить статистику планировщика запросов и перенести WAL в основной файл базы"""
+    async with engine.connect() as conn:
+        # optimize сам запускает ANALYZE для таблиц, где статистика устарела
+        await conn.exec_driver_sql("PRAGMA optimize")
+        busy, log_pages, checkpointed = (await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")).one()
+    if busy:
+        logger.debug(f"Checkpoint {engine.url.database}: база занята, перенесено {checkpointed} из {log_pages} страниц")
+
+
+async def maintenance_loop(databases, interval: float):
+    """Обслуживать базы каждые interval секунд, пока задачу не отменят; неподключенные пропускаются"""
+    while True:
+        await asyncio.sleep(interval)
+        for engine in [database.engine for database in databases if database.engine is not None]:
+            try:
+                await run_maintenance(engine)
+            except Exception as e:
+                logger.error(f"Ошибка обслуживания базы {engine.url.database}: {e}")
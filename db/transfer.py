@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+
+from .normalize import normalize_phone, normalize_tag, normalize_email, normalize_whatsapp
+from .sqlite import MAX_INTEGER
+
+# Колонки файлов выгрузки/загрузки для каждой таблицы
+FIELDS = {
+    "persons": ["id", "last_name", "first_name", "middle_name", "description"],
+    "accounts": ["id", "person_id", "messenger_type", "telegram_id", "telegram_tag",
+                 "phone_number", "whatsapp_id", "email"],
+    "whitelist": ["user_id", "username", "first_name", "last_name"],
+}
+
+FORMATS = ("csv", "jsonl")
+
+
+class RowError(ValueError):
+    """Строка файла не прошла проверку"""
+
+
+def detect_format(path, fmt=None):
+    """Формат файла: явно заданный или по расширению"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат {fmt!r}, поддерживаются: {', '.join(FORMATS)}")
+    return fmt
+
+
+def read_rows(fh, fmt):
+    """Построчно читать CSV (с заголовком) или JSONL, не загружая файл целиком.
+
+    Отдает пары (номер строки, dict); битые JSON-строки отдаются как RowError.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(fh)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(fh, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_num, RowError(f"некорректный JSON: {e.msg}")
+            continue
+        if not isinstance(row, dict):
+            yield line_num, RowError("ожидается JSON-объект")
+            continue
+        yield line_num, row
+
+
+class RowWriter:
+    """Построчная запись CSV/JSONL в открытый текстовый файл"""
+
+    def __init__(self, fh, fmt, fields):
+        self.fmt = fmt
+        self.fields = fields
+        self._fh = fh
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(fh, fieldnames=fields, extrasaction='ignore')
+            self._csv.writeheader()
+
+    def write(self, row):
+        if self._csv:
+            self._csv.writerow(row)
+        else:
+            self._fh.write(json.dumps({field: row.get(field) for field in self.fields}, ensure_ascii=False))
+            self._fh.write("\n")
+
+
+def _text(row, field, max_length, required=False):
+    value = row.get(field)
+    value = None if value is None else str(value).strip() or None
+    if value is None:
+        if required:
+            raise RowError(f"не заполнено поле {field}")
+        return None
+    if len(value) > max_length:
+        raise RowError(f"поле {field} длиннее {max_length} символов")
+    return value
+
+
+def _int(row, field, required=False):
+    value = row.get(field)
+    if value is None or str(value).strip() == "":
+        if required:
+            raise RowError(f"не заполнено поле {field}")
+        return None
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise RowError(f"поле {field} должно быть целым числом") from None
+    # Большее число не поместится в INTEGER SQLite и уронит вставку всей пачки
+    if not -MAX_INTEGER - 1 <= number <= MAX_INTEGER:
+        raise RowError(f"поле {field} вне диапазона 64-битного целого")
+    return number
+
+
+def parse_person(row):
+    return {
+        "id": _int(row, "id"),
+        "last_name": _text(row, "last_name", 100, required=True),
+        "first_name": _text(row, "first_name", 100, required=True),
+        "middle_name": _text(row, "middle_name", 100),
+        "description": _text(row, "description", 500),
+    }
+
+
+def parse_account(row):
+    phone_number = _text(row, "phone_number", 20)
+    telegram_tag = _text(row, "telegram_tag", 100)
+    whatsapp_id = _text(row, "whatsapp_id", 100)
+    email = _text(row, "email", 100)
+    return {
+        "id": _int(row, "id"),
+        "person_id": _int(row, "person_id", required=True),
+        "messenger_type": _text(row, "messenger_type", 50, required=True),
+        "telegram_id": _int(row, "telegram_id"),
+        "telegram_tag": telegram_tag,
+        "telegram_tag_normalized": normalize_tag(telegram_tag),
+        "phone_number": phone_number,
+        "phone_normalized": normalize_phone(phone_number),
+        "whatsapp_id": whatsapp_id,
+        "whatsapp_normalized": normalize_whatsapp(whatsapp_id),
+        "email": email,
+        "email_normalized": normalize_email(email),
+    }
+
+
+def parse_whitelist_user(row):
+    return {
+        "user_id": _int(row, "user_id", required=True),
+        "username": _text(row, "username", 100),
+        "first_name": _text(row, "first_name", 100),
+        "last_name": _text(row, "last_name", 100),
+    }
+
+
+PARSERS = {
+    "persons": parse_person,
+    "accounts": parse_account,
+    "whitelist": parse_whitelist_user,
+}
@@ -0,0 +1,101 @@
+"""Общие помощники тестов: бот с подменной сессией и сборка апдейтов.
+
+Апдейты прогоняются через настоящий диспетчер (create_dispatcher) с базами во
+временном каталоге; запросы к Bot API не уходят в сеть, а копятся в FakeSession.calls.
+"""
+import asyncio
+import datetime
+import itertools
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Настройки читаются при импорте app.config, поэтому окружение задается до импорта приложения
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+os.environ.setdefault("SUPER_ADMIN_ID", "1")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="tg_full_id_tests_")
+os.environ["SEND_CHAT_INTERVAL"] = "0"
+os.environ["SEND_GROUP_INTERVAL"] = "0"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.types import Chat, File, Message, Update, User  # noqa: E402
+
+SUPER_ADMIN_ID = 1
+
+_ids = itertools.count(1)
+# Роутеры приложения — модульные объекты и подключаются к одному диспетчеру, он общий для всех тестов
+_dispatcher = None
+
+
+class FakeSession(BaseSession):
+    """Сессия без сети: запоминает вызванные методы, файлы отдает из files"""
+
+    def __init__(self, files=None):
+        super().__init__()
+        self.calls = []
+        self.files = files or {}
+        # Содержимое отправленных документов: (имя файла, текст)
+        self.documents = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        name = type(method).__name__
+        if name == "SendDocument":
+            with open(method.document.path, encoding="utf-8") as fh:
+                self.documents.append((method.document.filename, fh.read()))
+        if name in ("SendMessage", "EditMessageText", "SendDocument"):
+            return Message(message_id=next(_ids), date=datetime.datetime.now(),
+                           chat=Chat(id=method.chat_id or 1, type="private"), text=getattr(method, "text", None))
+        if name == "GetFile":
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=method.file_id)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield self.files.get(url.rsplit("/", 1)[-1], b"")
+
+    async def close(self):
+        pass
+
+    def texts(self):
+        return [method.text for method in self.calls if type(method).__name__ == "SendMessage"]
+
+
+def message_update(text=None, user_id=SUPER_ADMIN_ID, **fields):
+    """Апдейт с сообщением пользователя user_id в личном чате"""
+    message = Message(message_id=next(_ids), date=datetime.datetime.now(),
+                      chat=Chat(id=user_id, type="private"),
+                      from_user=User(id=user_id, is_bot=False, first_name="Test"), text=text, **fields)
+    return Update(update_id=next(_ids), message=message)
+
+
+def run_updates(*updates, files=None, settle=0.0):
+    """Прогнать апдейты через диспетчер от старта до остановки; вернуть FakeSession с ответами.
+
+    settle — сколько подождать после последнего апдейта (отложенные ответы, фоновые отправки).
+    """
+    global _dispatcher
+    from app.main import create_dispatcher
+    from app.sender import send_scheduler
+
+    if _dispatcher is None:
+        _dispatcher = create_dispatcher()
+    dispatcher = _dispatcher
+
+    async def run():
+        session = FakeSession(files)
+        bot = Bot("42:TEST", session=session)
+        bot.session.middleware(send_scheduler)
+        await dispatcher.emit_startup(bot=bot)
+        try:
+            for update in updates:
+                await dispatcher.feed_update(bot, update)
+            await asyncio.sleep(settle)
+        finally:
+            await dispatcher.emit_shutdown(bot=bot)
+            await send_scheduler.close()
+        return session
+
+    return asyncio.run(run())
@@ -0,0 +1,43 @@
+import asyncio
+import sys
+
+import pytest
+
+from app import bulk
+from db.database import AsyncDatabase as WhitelistDatabase
+from db.transfer import RowError, parse_account
+
+
+def test_parse_account_rejects_int64_overflow():
+    with pytest.raises(RowError, match="telegram_id"):
+        parse_account({"person_id": "1", "messenger_type": "telegram", "telegram_id": str(2 ** 63)})
+    assert parse_account({"person_id": "1", "messenger_type": "telegram",
+                          "telegram_id": str(2 ** 63 - 1)})["telegram_id"] == 2 ** 63 - 1
+
+
+def test_import_rejects_oversized_row_and_continues(tmp_path):
+    path = tmp_path / "whitelist.csv"
+    path.write_text(f"user_id,username\n301,a\n{2 ** 64},b\n302,c\n", encoding="utf-8")
+
+    rejected = asyncio.run(bulk.import_file("whitelist", str(path), "csv", batch_size=10))
+
+    async def stored():
+        database = WhitelistDatabase()
+        await database.create_tables()
+        try:
+            return [user.user_id for user in await database.get_all_users()]
+        finally:
+            await database.close()
+
+    assert rejected == 1
+    assert {301, 302} <= set(asyncio.run(stored()))
+
+
+def test_unknown_extension_is_usage_error(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["bulk.py", "import", "persons", str(tmp_path / "persons.xlsx")])
+
+    with pytest.raises(SystemExit) as exit_info:
+        bulk.main()
+
+    assert exit_info.value.code == 2
+    assert "Неизвестный формат" in capsys.readouterr().err
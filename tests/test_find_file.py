@@ -0,0 +1,44 @@
+import asyncio
+import csv
+from io import StringIO
+
+from aiogram.types import Document
+
+from conftest import message_update, run_updates
+
+from app.bot.handlers.find import _read_identifiers
+from db.database_new import new_db_instance as accounts_db
+
+
+def _seed_account(phone_number):
+    async def seed():
+        await accounts_db.create_tables()
+        try:
+            person_id = await accounts_db.add_person("Иванов", "Иван")
+            await accounts_db.add_account(person_id, "telegram", phone_number=phone_number)
+        finally:
+            await accounts_db.close()
+    asyncio.run(seed())
+
+
+def test_read_identifiers_skips_header_row():
+    assert _read_identifiers("phone;email\n89990000001;a@b.ru\n") == ["89990000001", "a@b.ru"]
+    assert _read_identifiers("Телефон\n+79990000001\n") == ["+79990000001"]
+    # Первая строка с идентификатором — данные, а не заголовок
+    assert _read_identifiers("@alice\nphone\n") == ["@alice", "phone"]
+
+
+def test_find_file_with_header_returns_only_data_rows():
+    _seed_account("+79995550011")
+    content = "phone\n+79995550011\n89995550012\n".encode("utf-8")
+    document = Document(file_id="ids.csv", file_unique_id="ids", file_name="ids.csv", file_size=len(content))
+
+    session = run_updates(message_update(caption="/find_file", document=document), files={"ids.csv": content})
+
+    name, text = session.documents[-1]
+    rows = list(csv.DictReader(StringIO(text)))
+    assert name == "find_results.csv"
+    assert [(row["query"], row["status"]) for row in rows] == [
+        ("+79995550011", "found"),
+        ("89995550012", "not_found"),
+    ]
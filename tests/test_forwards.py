@@ -0,0 +1,31 @@
+import datetime
+
+from aiogram.types import Chat, MessageOriginChannel, MessageOriginHiddenUser, MessageOriginUser, User
+
+from conftest import message_update, run_updates
+
+
+def _forward(origin):
+    return message_update("пересланное", forward_origin=origin)
+
+
+def test_single_forward_escapes_sender_name():
+    origin = MessageOriginUser(date=datetime.datetime.now(),
+                               sender_user=User(id=777, is_bot=False, first_name="<S>", last_name="A & B"))
+
+    reply = run_updates(_forward(origin)).texts()[-1]
+
+    assert "Имя: &lt;S&gt; A &amp; B" in reply
+    assert "<S>" not in reply
+
+
+def test_single_forward_escapes_channel_title_and_hidden_name():
+    channel = MessageOriginChannel(date=datetime.datetime.now(), message_id=1,
+                                   chat=Chat(id=-100123, type="channel", title="<b>News</b>"))
+    hidden = MessageOriginHiddenUser(date=datetime.datetime.now(), sender_user_name="<Secret>")
+
+    channel_reply = run_updates(_forward(channel)).texts()[-1]
+    hidden_reply = run_updates(_forward(hidden)).texts()[-1]
+
+    assert "Название: &lt;b&gt;News&lt;/b&gt;" in channel_reply
+    assert hidden_reply.endswith("&lt;Secret&gt;")
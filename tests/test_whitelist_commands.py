@@ -0,0 +1,41 @@
+import asyncio
+
+from conftest import message_update, run_updates
+
+from db import db
+
+
+def _whitelisted(*user_ids):
+    async def check():
+        try:
+            return [await db.is_user_whitelisted(user_id) for user_id in user_ids]
+        finally:
+            await db.close()
+    return asyncio.run(check())
+
+
+def test_add_reports_oversized_id_as_invalid():
+    session = run_updates(message_update("/add 5 6 abc 99999999999999999999 ０7 0"))
+
+    reply = session.texts()[-1]
+    assert "✅ Добавлены в whitelist (2): 5, 6" in reply
+    assert "❌ Некорректные ID (4): abc, 99999999999999999999, ０7, 0" in reply
+    assert _whitelisted(5, 6) == [True, True]
+
+
+def test_add_accepts_max_int64_id():
+    session = run_updates(message_update(f"/add {2 ** 63 - 1} {2 ** 63}"))
+
+    reply = session.texts()[-1]
+    assert f"✅ Добавлены в whitelist (1): {2 ** 63 - 1}" in reply
+    assert f"❌ Некорректные ID (1): {2 ** 63}" in reply
+
+
+def test_remove_reports_oversized_id_as_invalid():
+    run_updates(message_update("/add 15 16"))
+    session = run_updates(message_update("/remove 15 99999999999999999999"))
+
+    reply = session.texts()[-1]
+    assert "🗑 Удалены (1): 15" in reply
+    assert "❌ Некорректные ID (1): 99999999999999999999" in reply
+    assert _whitelisted(15, 16) == [False, True]